@@ -267,6 +267,34 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    // Live updates: when the page declares an API (<body data-api-base="https://...">),
+    // apply the changed rows pushed over Server-Sent Events instead of re-downloading
+    function subscribeToUpdates() {
+        const apiBase = document.body.dataset.apiBase;
+        if (!apiBase || !window.EventSource || (!podiumContainer && !tableBody)) return;
+
+        const source = new EventSource(`${apiBase.replace(/\/$/, '')}/leaderboard/stream`);
+
+        source.addEventListener('leaderboard', (event) => {
+            const update = JSON.parse(event.data);
+            const byName = new Map(originalData.map(user => [user.Username, user]));
+            update.removed.forEach(name => byName.delete(name));
+            update.changes.forEach(user => byName.set(user.Username, user));
+
+            originalData = [...byName.values()].sort((a, b) => a.Rank - b.Rank);
+            if (searchInput && searchInput.value.trim()) {
+                performSearch();
+            } else {
+                leaderboardData = [...originalData];
+                if (podiumContainer) renderPodium(leaderboardData.slice(0, 3));
+                if (tableBody) renderTable(leaderboardData);
+            }
+        });
+
+        // Too many missed updates: reload the full leaderboard once
+        source.addEventListener('resync', () => fetchData());
+    }
+
     function renderPodium(topThree) {
         if (!podiumContainer) return;
         podiumContainer.innerHTML = '';
@@ -476,4 +504,5 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // Initialize with data fetch
     fetchData();
+    subscribeToUpdates();
 });
@@ -0,0 +1,167 @@
+"""
+Per-stage benchmark of the ranking pipeline.
+Generates a synthetic export, then times each stage of generate_rankings on
+it separately: read, parse (regex and time strings), block fingerprints,
+aggregation, DataFrame build, scoring and sorting, and the CSV, snapshot and
+Markdown writes, plus the whole single-worker ingest for reference. Results
+can be saved as JSON and compared against a run from another commit.
+
+Usage: python benchmarks/bench_pipeline.py [--quizzes 200] [--participants 2000]
+           [--repeat 5] [--json results.json] [--compare baseline.json]
+"""
+
+import sys
+import json
+import time
+import logging
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import time_parser  # noqa: E402
+from quiz_parser import QuizExportParser, block_fingerprint, iter_lines  # noqa: E402
+from ranking_engine import fold_results, rank_leaderboard, totals_to_frame  # noqa: E402
+from leaderboard_snapshot import write_snapshot  # noqa: E402
+from generate_rankings import (aggregate_file, fold_blocks, write_csv,  # noqa: E402
+                               write_markdown)
+from synthetic_export import write_export  # noqa: E402
+
+# Stages in pipeline order; each takes the previous stage's output
+STAGES = ('read', 'parse', 'fingerprint', 'aggregate', 'frame', 'rank',
+          'write_csv', 'write_snapshot', 'write_markdown', 'ingest')
+
+
+def timed(fn: Callable[[], Any], repeat: int,
+          setup: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+    """Run fn repeat times and return its timings in ms and its last result."""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {'best_ms': min(timings), 'mean_ms': sum(timings) / len(timings), 'result': result}
+
+
+def git_commit() -> Optional[str]:
+    """Short hash of the checked-out commit, if any."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True, cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(quizzes: int, participants: int, turnout: float, repeat: int,
+        seed: int = 0) -> Dict[str, Any]:
+    """Benchmark every stage on one synthetic export."""
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        export = tmp / "quizRankData.txt"
+        size = write_export(export, quizzes=quizzes, participants=participants,
+                            turnout=turnout, seed=seed)
+        outputs = {name: tmp / name for name in
+                   ("leaderboard.csv", "leaderboard.npy", "leaderboard.md")}
+
+        def cold() -> None:
+            # Each run of the generator starts with an empty time-string cache
+            time_parser._parse_time.cache_clear()
+
+        def remove_outputs() -> None:
+            # Without an existing file, atomic_write never skips the write
+            for path in outputs.values():
+                path.unlink(missing_ok=True)
+
+        stages: Dict[str, Dict[str, Any]] = {}
+        stages['read'] = timed(lambda: list(iter_lines(export)), repeat)
+        lines = stages['read']['result']
+        stages['parse'] = timed(lambda: list(QuizExportParser().parse_blocks(lines)), repeat, cold)
+        blocks = stages['parse']['result']
+        stages['fingerprint'] = timed(
+            lambda: [block_fingerprint(block.results) for block in blocks], repeat)
+
+        def aggregate() -> Dict[str, List[float]]:
+            users: Dict[str, List[float]] = {}
+            for block in blocks:
+                fold_results(block.results, users)
+            return users
+
+        stages['aggregate'] = timed(aggregate, repeat)
+        users = stages['aggregate']['result']
+        stages['frame'] = timed(lambda: totals_to_frame(users), repeat)
+        totals = stages['frame']['result']
+        stages['rank'] = timed(lambda: rank_leaderboard(totals), repeat)
+        final_output = stages['rank']['result']
+        stages['write_csv'] = timed(
+            lambda: write_csv(final_output, outputs["leaderboard.csv"]), repeat, remove_outputs)
+        stages['write_snapshot'] = timed(
+            lambda: write_snapshot(final_output, outputs["leaderboard.npy"]), repeat, remove_outputs)
+        stages['write_markdown'] = timed(
+            lambda: write_markdown(final_output, outputs["leaderboard.md"]), repeat, remove_outputs)
+        stages['ingest'] = timed(lambda: fold_blocks({str(export): aggregate_file(export)}),
+                                 repeat, cold)
+
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'params': {'quizzes': quizzes, 'participants': participants, 'turnout': turnout,
+                   'repeat': repeat, 'seed': seed},
+        'input': {'bytes': size, 'lines': len(lines), 'blocks': len(blocks),
+                  'results': sum(len(block.results) for block in blocks),
+                  'participants': len(users)},
+        'stages': {name: {'best_ms': round(stages[name]['best_ms'], 3),
+                          'mean_ms': round(stages[name]['mean_ms'], 3)} for name in STAGES},
+    }
+
+
+def print_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> None:
+    """Print the stage timings, with the change against a baseline run if given."""
+    info = report['input']
+    print(f"{info['results']:,} results in {info['blocks']:,} quizzes, "
+          f"{info['participants']:,} participants, {info['bytes'] / 1e6:.1f} MB "
+          f"(commit {report['commit'] or 'unknown'})")
+    header = f"{'stage':<16}{'best ms':>10}{'mean ms':>10}"
+    if baseline:
+        header += f"{'base ms':>10}{'change':>9}"
+    print(header)
+    for name, timing in report['stages'].items():
+        row = f"{name:<16}{timing['best_ms']:>10.2f}{timing['mean_ms']:>10.2f}"
+        base = baseline['stages'].get(name) if baseline else None
+        if base:
+            change = (timing['best_ms'] / base['best_ms'] - 1) * 100 if base['best_ms'] else 0.0
+            row += f"{base['best_ms']:>10.2f}{change:>+8.1f}%"
+        print(row)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark each stage of the ranking pipeline")
+    parser.add_argument("--quizzes", type=int, default=200)
+    parser.add_argument("--participants", type=int, default=2000)
+    parser.add_argument("--turnout", type=float, default=0.3)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=Path, help="Also save the results to this JSON file")
+    parser.add_argument("--compare", type=Path, help="JSON results of a baseline run")
+    args = parser.parse_args()
+
+    # Keep the per-stage log lines out of the report
+    logging.getLogger().setLevel(logging.WARNING)
+
+    report = run(args.quizzes, args.participants, args.turnout, args.repeat, args.seed)
+    baseline = json.loads(args.compare.read_text(encoding='utf-8')) if args.compare else None
+    if baseline and baseline.get('params', {}) != report['params']:
+        print("Warning: baseline was run with different parameters", file=sys.stderr)
+    print_report(report, baseline)
+
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2) + "\n", encoding='utf-8')
+        print(f"Results saved to {args.json}")
@@ -0,0 +1,90 @@
+"""
+Benchmark for the shared ranking engine.
+Times rank_leaderboard() on synthetic per-user totals at several participant
+counts and prints the per-call latency, next to the announcement path:
+scoring every user once (UserScores), then the top 10 and one user's rank,
+and the live path: one result folded into a RankTracker, and a rank lookup.
+
+Usage: python benchmarks/bench_ranking_engine.py [--sizes 1000 100000 1000000] [--repeat 5]
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from rank_tracker import RankTracker  # noqa: E402
+from ranking_engine import UserScores, rank_leaderboard  # noqa: E402
+
+
+def make_totals(n: int, seed: int = 0) -> pd.DataFrame:
+    """Synthetic per-user totals shaped like the real aggregation output."""
+    rng = np.random.default_rng(seed)
+    quizzes = rng.integers(1, 40, size=n)
+    return pd.DataFrame({
+        'Username': [f"user_{i}" for i in range(n)],
+        'Quizzes_Participated': quizzes,
+        'Total_Score': (rng.integers(0, 6, size=n) * quizzes),
+        'Total_Seconds': rng.uniform(20, 150, size=n) * quizzes,
+    })
+
+
+def best_ms(fn: Callable[[], Any], repeat: int) -> float:
+    """Best latency of fn in milliseconds, after a warm-up call."""
+    fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def tracker_update(tracker: RankTracker, username: str) -> None:
+    """Fold one result into a user's totals and take it back out (two updates)."""
+    tracker.update(username, [1, 0, 60.0])
+    tracker.update(username, [-1, 0, -60.0])
+
+
+def bench(n: int, repeat: int) -> Dict[str, float]:
+    """Return the best per-call latencies in milliseconds for n participants."""
+    totals = make_totals(n)
+    users: Dict[str, List[float]] = {
+        row.Username: [row.Quizzes_Participated, row.Total_Score, row.Total_Seconds]
+        for row in totals.itertuples(index=False)
+    }
+    scores = UserScores(users)
+    tracker = RankTracker(users)
+    # A user holding neither maximum, so the update never renormalizes
+    max_count = totals['Quizzes_Participated'].max()
+    username = next(name for name, (count, score, _) in users.items()
+                    if count < max_count - 1 and score < 5 * count)
+    return {
+        'full': best_ms(lambda: rank_leaderboard(totals), repeat),
+        'scores': best_ms(lambda: UserScores(users), repeat),
+        'top10': best_ms(lambda: scores.top(10), repeat),
+        'rank_of': best_ms(lambda: scores.rank_of(f"user_{n // 2}"), repeat),
+        'update': best_ms(lambda: tracker_update(tracker, username), repeat) / 2,
+        'rank': best_ms(lambda: tracker.rank(f"user_{n // 2}"), repeat),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark rank_leaderboard(), UserScores and RankTracker")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'participants':>12}{'full ms':>11}{'scores ms':>11}{'top10 ms':>11}{'rank_of ms':>12}"
+          f"{'update ms':>11}{'rank ms':>9}")
+    for size in args.sizes:
+        timings = bench(size, args.repeat)
+        print(f"{size:>12,}{timings['full']:>11.2f}{timings['scores']:>11.2f}"
+              f"{timings['top10']:>11.2f}{timings['rank_of']:>12.2f}"
+              f"{timings['update']:>11.3f}{timings['rank']:>9.3f}")
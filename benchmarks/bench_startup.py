@@ -0,0 +1,149 @@
+"""
+Cold-start benchmark of the entry points.
+Imports each entry point in a fresh interpreter and times the import, plus
+the API's first leaderboard build from the snapshot and from the CSV, on a
+synthetic leaderboard. Each case has an import-time budget and a list of
+heavy modules it must not load (the API serves a precomputed leaderboard
+without pandas); --check exits non-zero when a case breaks either.
+
+Usage: python benchmarks/bench_startup.py [--participants 10000] [--repeat 5]
+           [--check] [--json results.json]
+"""
+
+import os
+import sys
+import json
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / "scripts"
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+from bench_pipeline import git_commit  # noqa: E402
+from load_test import write_leaderboard  # noqa: E402
+
+HEAVY_MODULES = ('pandas', 'numpy')
+
+# Run in the child interpreter; prints its timings as JSON on the last line
+CHILD = """
+import sys, json, time
+start = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+{first}
+done = time.perf_counter()
+print(json.dumps({{
+    'import_ms': (imported - start) * 1000,
+    'first_ms': (done - imported) * 1000 if {timed_first} else None,
+    'loaded': [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+# name -> (module, code run after the import, leaderboard file to remove)
+CASES: Dict[str, Tuple[str, Optional[str], Optional[str]]] = {
+    'api': ('main', None, None),
+    'api_snapshot': ('main', "main.leaderboard_cache.get()", None),
+    'api_csv': ('main', "main.leaderboard_cache.get()", "cumulative_leaderboard.npy"),
+    'generate_rankings': ('generate_rankings', None, None),
+    'clean_data': ('clean_data', None, None),
+}
+
+# Milliseconds for the import plus the first build, generous enough for a
+# slow CI runner; the FastAPI import alone takes about half of the API's
+BUDGET_MS = {
+    'api': 1000,
+    'api_snapshot': 1200,
+    'api_csv': 1500,
+    'generate_rankings': 500,
+    'clean_data': 100,
+}
+
+# Modules the case must not import
+FORBIDDEN = {
+    'api': ('pandas',),
+    'api_snapshot': ('pandas',),
+    'api_csv': ('pandas',),
+    'generate_rankings': ('pandas',),
+    'clean_data': ('pandas', 'numpy'),
+}
+
+
+def run_case(name: str, data_dir: Path) -> Dict[str, Any]:
+    """Time one case in a fresh interpreter against data_dir."""
+    module, first, _ = CASES[name]
+    code = CHILD.format(module=module, first=first or "pass", timed_first=first is not None,
+                        heavy=HEAVY_MODULES)
+    env = dict(os.environ, QUIZ_DATA_DIR=str(data_dir))
+    completed = subprocess.run([sys.executable, "-c", code], cwd=SCRIPTS_DIR, env=env,
+                               capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{name} failed:\n{completed.stderr[-2000:]}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def run(participants: int, repeat: int, cases: List[str], seed: int = 0) -> Dict[str, Any]:
+    """Best-of-repeat timings of every case."""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in cases:
+            data_dir = Path(tmp) / name
+            write_leaderboard(data_dir, participants, seed)
+            removed = CASES[name][2]
+            if removed:
+                (data_dir / removed).unlink()
+            runs = [run_case(name, data_dir) for _ in range(repeat)]
+            best = min(runs, key=lambda r: r['import_ms'] + (r['first_ms'] or 0))
+            total = best['import_ms'] + (best['first_ms'] or 0)
+            results[name] = {
+                'import_ms': round(best['import_ms'], 1),
+                'first_ms': round(best['first_ms'], 1) if best['first_ms'] is not None else None,
+                'total_ms': round(total, 1),
+                'budget_ms': BUDGET_MS[name],
+                'loaded': best['loaded'],
+                'ok': total <= BUDGET_MS[name] and not set(best['loaded']) & set(FORBIDDEN[name]),
+            }
+
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'params': {'participants': participants, 'repeat': repeat, 'seed': seed},
+        'cases': results,
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    """Print the timings of every case against its budget."""
+    print(f"{'case':<19}{'import ms':>10}{'first ms':>10}{'total ms':>10}{'budget':>8}  loaded")
+    for name, result in report['cases'].items():
+        first = f"{result['first_ms']:>10.1f}" if result['first_ms'] is not None else f"{'-':>10}"
+        status = "" if result['ok'] else "  OVER BUDGET"
+        print(f"{name:<19}{result['import_ms']:>10.1f}{first}{result['total_ms']:>10.1f}"
+              f"{result['budget_ms']:>8}  {', '.join(result['loaded']) or '-'}{status}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the cold start of the entry points")
+    parser.add_argument("--participants", type=int, default=10_000,
+                        help="Size of the synthetic leaderboard the API loads")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--check", action="store_true",
+                        help="Exit with status 1 if a case is over budget or loads a forbidden module")
+    parser.add_argument("--json", type=Path, help="Also save the results to this JSON file")
+    args = parser.parse_args()
+
+    report = run(args.participants, args.repeat, args.cases, args.seed)
+    print_report(report)
+
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2) + "\n", encoding='utf-8')
+        print(f"Results saved to {args.json}")
+    if args.check and not all(result['ok'] for result in report['cases'].values()):
+        sys.exit(1)
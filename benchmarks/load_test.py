@@ -0,0 +1,276 @@
+"""
+Load test for the leaderboard API.
+Serves synthetic leaderboards of several sizes and drives each endpoint with
+a fixed number of concurrent async clients, reporting throughput and
+p50/p95/p99 latency per endpoint and size.
+
+By default every size boots scripts/main.py on a free localhost port (with
+API_WORKERS worker processes), pointed at a temporary data directory via
+QUIZ_DATA_DIR. --in-process serves the app through httpx's ASGI transport
+instead, which leaves out uvicorn and the network (requests then run one
+after another, so latencies are pure service times), and --url targets an
+already running deployment (for example the Docker container) with its own
+data. The load comes from a single event loop, so throughput far above a
+few thousand requests per second measures the client rather than the API.
+
+Usage: python benchmarks/load_test.py [--sizes 1000 10000 100000] [--concurrency 32]
+           [--duration 10] [--workers 1] [--in-process | --url URL] [--json results.json]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+import pandas as pd
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / "scripts"
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+from ranking_engine import rank_leaderboard  # noqa: E402
+from leaderboard_snapshot import write_snapshot  # noqa: E402
+from synthetic_export import make_names  # noqa: E402
+from bench_pipeline import git_commit  # noqa: E402
+
+SERVER_START_TIMEOUT_SECONDS = 120.0
+REQUEST_TIMEOUT_SECONDS = 30.0
+SAMPLE_NAMES = 500
+
+# Request = (path, headers), built from the sampled usernames and full-response ETag
+RequestFactory = Callable[[random.Random, List[str], str, int], Tuple[str, Dict[str, str]]]
+
+ENDPOINTS: Dict[str, RequestFactory] = {
+    'full': lambda rng, names, etag, size: ("/leaderboard", {}),
+    'not_modified': lambda rng, names, etag, size: ("/leaderboard", {"If-None-Match": etag}),
+    'page': lambda rng, names, etag, size: (
+        f"/leaderboard?offset={rng.randrange(max(1, size - 50))}&limit=50", {}),
+    'sorted': lambda rng, names, etag, size: ("/leaderboard?limit=50&sort=-Avg_Points", {}),
+    'search': lambda rng, names, etag, size: (
+        f"/leaderboard?q={rng.choice(names)[:4]}&limit=20", {}),
+    'user': lambda rng, names, etag, size: (f"/users/{rng.choice(names)}?k=2", {}),
+}
+
+
+def write_leaderboard(data_dir: Path, participants: int, seed: int = 0) -> None:
+    """Write a ranked synthetic leaderboard CSV and snapshot into data_dir."""
+    rng = np.random.default_rng(seed)
+    names = [name.lstrip('@') for name in make_names(participants, random.Random(seed))]
+    quizzes = rng.integers(1, 40, size=participants)
+    totals = pd.DataFrame({
+        'Username': names,
+        'Quizzes_Participated': quizzes,
+        'Total_Score': rng.integers(0, 6, size=participants) * quizzes,
+        'Total_Seconds': rng.uniform(20, 150, size=participants) * quizzes,
+    })
+    final_output = rank_leaderboard(totals)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    csv_path = data_dir / "cumulative_leaderboard.csv"
+    final_output.to_csv(csv_path, index=False)
+    write_snapshot(final_output, csv_path.with_suffix(".npy"))
+
+
+async def drive(client: httpx.AsyncClient, factory: RequestFactory, names: List[str],
+                etag: str, size: int, concurrency: int, duration: float,
+                seed: int) -> Dict[str, Any]:
+    """Send requests from concurrency clients for duration seconds."""
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def client_loop(client_seed: int) -> None:
+        nonlocal errors
+        rng = random.Random(client_seed)
+        while time.perf_counter() < deadline:
+            path, headers = factory(rng, names, etag, size)
+            start = time.perf_counter()
+            try:
+                response = await client.get(path, headers=headers)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client_loop(seed + i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    timings = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99])
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(float(p50), 2),
+        'p95_ms': round(float(p95), 2),
+        'p99_ms': round(float(p99), 2),
+        'max_ms': round(float(timings.max()), 2),
+    }
+
+
+async def run_endpoints(client: httpx.AsyncClient, endpoints: List[str], concurrency: int,
+                        duration: float, seed: int) -> List[Dict[str, Any]]:
+    """Warm the server up, then load each endpoint in turn."""
+    response = await client.get("/leaderboard")
+    response.raise_for_status()
+    etag = response.headers.get("etag", "")
+    sample = (await client.get(f"/leaderboard?limit={SAMPLE_NAMES}")).json()
+    size = sample['total_participants']
+    names = [row['Username'] for row in sample['data']]
+
+    results = []
+    for name in endpoints:
+        factory = ENDPOINTS[name]
+        # Warm-up builds the indexes and caches an endpoint relies on
+        await drive(client, factory, names, etag, size, concurrency, min(1.0, duration), seed)
+        stats = await drive(client, factory, names, etag, size, concurrency, duration, seed)
+        results.append({'participants': size, 'endpoint': name, **stats})
+        print(f"{size:>12,} {name:<13}{stats['rps']:>9.1f}{stats['p50_ms']:>9.2f}"
+              f"{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}{stats['errors']:>8}", flush=True)
+    return results
+
+
+def load_url(base_url: str, endpoints: List[str], concurrency: int, duration: float,
+             seed: int, transport: Optional[httpx.AsyncBaseTransport] = None) -> List[Dict[str, Any]]:
+    """Run every endpoint against one server."""
+    async def main() -> List[Dict[str, Any]]:
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=base_url, transport=transport, limits=limits,
+                                     timeout=REQUEST_TIMEOUT_SECONDS) as client:
+            return await run_endpoints(client, endpoints, concurrency, duration, seed)
+    return asyncio.run(main())
+
+
+def load_in_process(endpoints: List[str], concurrency: int, duration: float,
+                    seed: int) -> List[Dict[str, Any]]:
+    """Serve the app through the ASGI transport; runs in a fresh process per size."""
+    logging.disable(logging.INFO)
+    import main  # Config reads QUIZ_DATA_DIR on import
+    transport = httpx.ASGITransport(app=main.app)
+    return load_url("http://loadtest", endpoints, concurrency, duration, seed, transport)
+
+
+def free_port() -> int:
+    """A localhost port that is currently unused."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(data_dir: Path, port: int, workers: int, log_path: Path) -> subprocess.Popen:
+    """Boot scripts/main.py against data_dir and wait until it answers."""
+    env = dict(os.environ, QUIZ_DATA_DIR=str(data_dir), API_HOST="127.0.0.1",
+               API_PORT=str(port), API_WORKERS=str(workers))
+    log = open(log_path, 'wb')
+    server = subprocess.Popen([sys.executable, str(SCRIPTS_DIR / "main.py")], env=env,
+                              stdout=log, stderr=subprocess.STDOUT, cwd=SCRIPTS_DIR)
+    deadline = time.monotonic() + SERVER_START_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            break
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=1.0).status_code == 200:
+                return server
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    stop_server(server)
+    raise RuntimeError(f"Server did not start, see {log_path}:\n{log_path.read_text(errors='replace')[-2000:]}")
+
+
+def stop_server(server: subprocess.Popen) -> None:
+    """Stop the server and its workers."""
+    server.terminate()
+    try:
+        server.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+def run(sizes: List[int], endpoints: List[str], concurrency: int, duration: float,
+        workers: int, in_process: bool, seed: int) -> List[Dict[str, Any]]:
+    """Load every endpoint at every leaderboard size."""
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            data_dir = Path(tmp) / "data"
+            write_leaderboard(data_dir, size, seed)
+            if in_process:
+                # A spawned process imports the app with this data directory
+                os.environ["QUIZ_DATA_DIR"] = str(data_dir)
+                try:
+                    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                        results += pool.submit(load_in_process, endpoints, concurrency,
+                                               duration, seed).result()
+                finally:
+                    del os.environ["QUIZ_DATA_DIR"]
+            else:
+                port = free_port()
+                server = start_server(data_dir, port, workers, Path(tmp) / "server.log")
+                try:
+                    results += load_url(f"http://127.0.0.1:{port}", endpoints, concurrency,
+                                        duration, seed)
+                finally:
+                    stop_server(server)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the leaderboard API")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000],
+                        help="Synthetic leaderboard sizes (participants)")
+    parser.add_argument("--endpoints", nargs="+", choices=sorted(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per endpoint")
+    parser.add_argument("--workers", type=int, default=1, help="API_WORKERS of the booted server")
+    parser.add_argument("--seed", type=int, default=0)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--in-process", action="store_true",
+                      help="Serve the app in-process through the ASGI transport")
+    mode.add_argument("--url", help="Load an already running API with its own data")
+    parser.add_argument("--json", type=Path, help="Also save the results to this JSON file")
+    args = parser.parse_args()
+
+    # Keep per-request client logging out of the report
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print(f"{'participants':>12} {'endpoint':<13}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'p99 ms':>9}{'errors':>8}")
+    if args.url:
+        results = load_url(args.url, args.endpoints, args.concurrency, args.duration, args.seed)
+        mode_name = "url"
+    else:
+        results = run(args.sizes, args.endpoints, args.concurrency, args.duration,
+                      args.workers, args.in_process, args.seed)
+        mode_name = "in-process" if args.in_process else "server"
+
+    if args.json:
+        report = {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'mode': mode_name,
+            'params': {'concurrency': args.concurrency, 'duration': args.duration,
+                       'workers': args.workers, 'seed': args.seed},
+            'results': results,
+        }
+        args.json.write_text(json.dumps(report, indent=2) + "\n", encoding='utf-8')
+        print(f"Results saved to {args.json}")
@@ -0,0 +1,128 @@
+"""
+Synthetic Telegram quiz export generator.
+Writes quizRankData.txt-style exports of a chosen size: a pool of
+participants with mixed @handles and plain names, a random turnout per quiz,
+scores out of 5 and '45.4 sec' / '2 min 8 sec' answer times, optionally
+with the metadata lines of an uncleaned export and re-pasted blocks.
+
+Usage: python benchmarks/synthetic_export.py OUTPUT [--quizzes 200] [--participants 2000]
+"""
+
+import random
+import argparse
+from pathlib import Path
+from typing import Iterator, List
+
+MEDALS = ('🥇', '🥈', '🥉')
+QUESTIONS = 5
+
+_FIRST_NAMES = ('Abel', 'Hanna', 'Dawit', 'Meron', 'Yonas', 'Selam', 'Kidus', 'Ruth',
+                'Nahom', 'Bethel', 'Eyob', 'Mahlet', 'Henok', 'Liya', 'Natnael', 'Saron')
+_HANDLE_WORDS = ('tewahedo', 'gibi', 'kidus', 'arat_kilo', 'psalm', 'zion', 'mahlet',
+                 'selam', 'orthodox', 'geez', 'kine', 'tsion')
+
+
+def make_names(count: int, rng: random.Random, handle_share: float = 0.7) -> List[str]:
+    """Distinct participant names, about handle_share of them @handles."""
+    names = []
+    for i in range(count):
+        if rng.random() < handle_share:
+            names.append(f"@{rng.choice(_HANDLE_WORDS)}_{i}")
+        elif rng.random() < 0.5:
+            names.append(f"{rng.choice(_FIRST_NAMES)} {i}")
+        else:
+            names.append(f"{rng.choice(_FIRST_NAMES)}{i}")
+    return names
+
+
+def format_time(seconds: float) -> str:
+    """Render an answer time the way Telegram does."""
+    if seconds < 60:
+        return f"{seconds:.1f}".rstrip('0').rstrip('.') + " sec"
+    minutes, rest = divmod(int(seconds), 60)
+    return f"{minutes} min {rest} sec"
+
+
+def quiz_block(number: int, names: List[str], rng: random.Random, metadata: bool) -> List[str]:
+    """The lines of one quiz's result block, best result first."""
+    results = []
+    for name in names:
+        skill = rng.random()
+        score = sum(rng.random() < 0.4 + 0.6 * skill for _ in range(QUESTIONS))
+        seconds = round(rng.uniform(15, 75) * (1.6 - skill) * QUESTIONS / 3, 1)
+        results.append((-score, seconds, name))
+    results.sort()
+
+    lines = []
+    if metadata:
+        lines += [f"🎲 Quiz 'Weekly quiz {number}'\n", f"🖊 {QUESTIONS} questions\n",
+                  "⏱ 45 seconds per question\n", f"🤓 {len(results)} people took the quiz\n",
+                  "\n", "🏆 Top results:\n", "\n"]
+    for rank, (score, seconds, name) in enumerate(results, 1):
+        marker = f" {MEDALS[rank - 1]}" if rank <= len(MEDALS) else f"{rank:>3}. "
+        lines.append(f"{marker} {name} – {-score} ({format_time(seconds)})\n")
+    return lines
+
+
+def generate_export(quizzes: int = 200, participants: int = 2000, turnout: float = 0.3,
+                    duplicate_rate: float = 0.0, metadata: bool = False,
+                    seed: int = 0) -> Iterator[str]:
+    """Yield the lines of a synthetic export.
+
+    Args:
+        quizzes: Number of quiz blocks
+        participants: Size of the participant pool
+        turnout: Average share of the pool taking part in each quiz; regular
+            participants take part far more often than occasional ones
+        duplicate_rate: Chance that a block is pasted a second time
+        metadata: Include the header lines of an uncleaned export
+        seed: Seed for reproducible exports
+    """
+    rng = random.Random(seed)
+    names = make_names(participants, rng)
+    # Long-tailed participation: a core of regulars and many occasional players
+    weights = [min(1.0, 3 * turnout * rng.random() ** 2) for _ in names]
+
+    previous: List[str] = []
+    for number in range(1, quizzes + 1):
+        taking_part = [name for name, weight in zip(names, weights) if rng.random() < weight]
+        block = quiz_block(number, taking_part or names[:1], rng, metadata)
+        if number > 1:
+            yield "\n"
+            yield "\n"
+        yield from block
+        if previous and rng.random() < duplicate_rate:
+            yield "\n"
+            yield "\n"
+            yield from previous
+        previous = block
+
+
+def write_export(path: Path, **options) -> int:
+    """Write a synthetic export to path; options as for generate_export.
+
+    Returns:
+        int: Size of the export in bytes
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.writelines(generate_export(**options))
+    return path.stat().st_size
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic quizRankData.txt export")
+    parser.add_argument("output", type=Path)
+    parser.add_argument("--quizzes", type=int, default=200)
+    parser.add_argument("--participants", type=int, default=2000)
+    parser.add_argument("--turnout", type=float, default=0.3)
+    parser.add_argument("--duplicate-rate", type=float, default=0.0)
+    parser.add_argument("--metadata", action="store_true", help="Include uncleaned header lines")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    size = write_export(args.output, quizzes=args.quizzes, participants=args.participants,
+                        turnout=args.turnout, duplicate_rate=args.duplicate_rate,
+                        metadata=args.metadata, seed=args.seed)
+    print(f"Wrote {size:,} bytes to {args.output}")
@@ -1,22 +1,19 @@
 import os
-import shutil
 import sys
+from pathlib import Path
 
-def clean_quiz_data(file_path):
-    # Check if file exists
-    if not os.path.exists(file_path):
-        print(f"Error: File not found at {file_path}")
-        return
-
-    # Create a backup
-    backup_path = file_path + ".bak"
-    shutil.copy2(file_path, backup_path)
-    print(f"Backup created at {backup_path}")
+from utils import atomic_write
 
 def remove_metadata_lines(lines):
-    """Removes lines starting with specific emojis."""
+    """Removes lines starting with specific emojis (lazily, line by line)."""
     remove_prefixes = ('🖊', '🏆', '⏱', '🤓')
-    return [line for line in lines if not line.strip().startswith(remove_prefixes)]
+    return (line for line in lines if not line.strip().startswith(remove_prefixes))
+
+def count_lines(lines, counts, key):
+    """Pass lines through unchanged while counting them into counts[key]."""
+    for line in lines:
+        counts[key] += 1
+        yield line
 
 def get_line_number(text):
     """Extracts the ranking number from a line if present."""
@@ -33,8 +30,9 @@ def add_formatting_spaces(lines):
     1. Between a Numbered line and a Gold (🥇) line: Force 2 empty lines.
     2. Between consecutive numbered lines (e.g., 20->21): Remove empty lines to keep list contiguous.
     3. Otherwise: Preserve single empty lines or content.
+
+    Lines are yielded as they are processed, so any iterable can be streamed.
     """
-    final_lines = []
     
     # Track the type of the previous non-empty line
     # Types: 'NUMBER', 'GOLD', 'OTHER', None
@@ -62,8 +60,8 @@ def add_formatting_spaces(lines):
         # Determine spacing based on transition from last_type to current line_type
         if last_type == 'NUMBER' and line_type == 'GOLD':
             # Transition from Number to New Quiz (Gold) -> 2 empty lines
-            final_lines.append('\n')
-            final_lines.append('\n')
+            yield '\n'
+            yield '\n'
         elif last_type == 'NUMBER' and line_type == 'NUMBER':
             # Transition from Number to Number (e.g., 20->21) -> No empty lines (contiguous)
             pass
@@ -72,12 +70,10 @@ def add_formatting_spaces(lines):
              # (lines from readlines already have \n, so we don't strictly need to add one unless we stripped it)
              pass
 
-        # Append the line itself
-        final_lines.append(line)
+        # Emit the line itself
+        yield line
         
         last_type = line_type
-    
-    return final_lines
 
 def clean_quiz_data(file_path):
     # Check if file exists
@@ -85,36 +81,31 @@ def clean_quiz_data(file_path):
         print(f"Error: File not found at {file_path}")
         return
 
-    # Create a backup
-    backup_path = file_path + ".bak"
-    shutil.copy2(file_path, backup_path)
-    print(f"Backup created at {backup_path}")
-
+    counts = {'original': 0, 'intermediate': 0, 'final': 0}
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-
-        # Step 1: Remove unwanted metadata
-        cleaned_lines = remove_metadata_lines(lines)
-        
-        # Step 2: Apply formatting rules
-        final_lines = add_formatting_spaces(cleaned_lines)
-        
-        # Write back to file
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.writelines(final_lines)
+        # Stream through the cleaning steps into a temporary file that replaces
+        # the original atomically; a .bak is kept only if anything changed
+        with open(file_path, 'r', encoding='utf-8') as src, \
+                atomic_write(Path(file_path), backup_suffix='.bak') as dst:
+            lines = count_lines(src, counts, 'original')
+            
+            # Step 1: Remove unwanted metadata
+            cleaned_lines = count_lines(remove_metadata_lines(lines), counts, 'intermediate')
+            
+            # Step 2: Apply formatting rules
+            final_lines = count_lines(add_formatting_spaces(cleaned_lines), counts, 'final')
+            
+            dst.writelines(final_lines)
         
         print(f"Successfully cleaned {file_path}")
-        print(f"Original lines: {len(lines)}")
-        print(f"Intermediate lines: {len(cleaned_lines)}")
-        print(f"Final lines: {len(final_lines)}")
+        print(f"Original lines: {counts['original']}")
+        print(f"Intermediate lines: {counts['intermediate']}")
+        print(f"Final lines: {counts['final']}")
 
     except Exception as e:
         print(f"An error occurred: {e}")
-        # Restore from backup if something went wrong
-        if os.path.exists(backup_path):
-            shutil.copy2(backup_path, file_path)
-            print("Restored original file from backup due to error.")
+        # The original is only replaced once fully written
+        print("Original file left untouched due to error.")
 
 if __name__ == "__main__":
     # Use relative path from the script's location
@@ -1,35 +1,116 @@
 """
 Data validation utilities for the Arat Kilo Gibi Gubae Quiz System.
-Provides input sanitization and validation functions.
+Provides input sanitization and validation functions, per line or in
+vectorized batches that report rejections per rule instead of per line.
 """
 
 import re
 import html
-from typing import Dict, Any, Optional, List
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Dict, Any, Optional, List, Sequence
 from pathlib import Path
 import logging
 
+from time_parser import TIME_PATTERN, is_valid_time, parse_time_series, parse_time_to_seconds
+from utils import Config
+
 logger = logging.getLogger(__name__)
 
+# Batch validation rules in the order they are checked. A line failing a
+# rejection rule is dropped by quiz_parser too; the limit rules only flag
+# result lines that are still ingested.
+VALIDATION_RULES = ('pattern', 'username')
+LIMIT_RULES = ('username_length', 'score', 'time_format', 'time_range')
+
+
+@dataclass
+class BatchValidation:
+    """Outcome of validating a batch of quiz lines.
+
+    Attributes:
+        lines: Non-blank lines checked
+        valid: Lines that passed every rejection rule
+        rejections: Rejected lines per rule; a line counts for the first
+            rule in VALIDATION_RULES it fails
+        flags: Valid lines outside the limits of validate_quiz_line, per
+            the first rule in LIMIT_RULES they fail
+        samples: The first Config.VALIDATION_SAMPLE_LINES line numbers
+            rejected or flagged by each rule
+        records: Line, Username, Score, Seconds and OriginalLine of the
+            valid lines without flags, if kept
+    """
+    lines: int = 0
+    valid: int = 0
+    rejections: Dict[str, int] = field(default_factory=dict)
+    flags: Dict[str, int] = field(default_factory=dict)
+    samples: Dict[str, List[int]] = field(default_factory=dict)
+    records: Optional["pd.DataFrame"] = None
+
+    @property
+    def results(self) -> int:
+        """Lines shaped like a quiz result; other lines only fail 'pattern'."""
+        return self.lines - self.rejections.get('pattern', 0)
+
+    @property
+    def invalid_results(self) -> int:
+        """Result lines rejected by a field rule."""
+        return self.results - self.valid
+
+    @property
+    def invalid_rate(self) -> float:
+        """Share of the result lines that were rejected."""
+        return self.invalid_results / self.results if self.results else 0.0
+
+    def merge(self, other: 'BatchValidation') -> None:
+        """Add the counts, samples and records of a later batch in place."""
+        import pandas as pd
+
+        self.lines += other.lines
+        self.valid += other.valid
+        for counts, other_counts in ((self.rejections, other.rejections), (self.flags, other.flags)):
+            for rule, count in other_counts.items():
+                counts[rule] = counts.get(rule, 0) + count
+                samples = self.samples.setdefault(rule, [])
+                samples.extend(other.samples[rule][:Config.VALIDATION_SAMPLE_LINES - len(samples)])
+        if other.records is not None:
+            self.records = (other.records if self.records is None
+                            else pd.concat([self.records, other.records], ignore_index=True))
+
+    def summary(self) -> str:
+        """One line listing the rejections and flags per rule with sample line numbers."""
+        def listed(counts: Dict[str, int]) -> str:
+            return '; '.join(f"{rule} {count} (lines {', '.join(map(str, self.samples[rule]))})"
+                             for rule, count in counts.items())
+
+        return (f"{self.valid} valid of {self.lines} lines"
+                + (f"; rejected: {listed(self.rejections)}" if self.rejections else "")
+                + (f"; flagged: {listed(self.flags)}" if self.flags else ""))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The counts and samples, without the records, for a JSON report."""
+        return {'lines': self.lines, 'valid': self.valid, 'invalid_rate': round(self.invalid_rate, 6),
+                'rejections': self.rejections, 'flags': self.flags, 'samples': self.samples}
+
+
 class DataValidator:
     """Utility class for validating and sanitizing quiz data."""
     
     # Regex patterns for validation
     USERNAME_PATTERN = re.compile(r'^[a-zA-Z0-9_\-.]{3,30}$')
     SCORE_PATTERN = re.compile(r'^\d+$')
-    TIME_PATTERN = re.compile(r'^\d+(?:\.\d+)?\s*(?:sec|seconds?|min|minutes?)?$')
+    TIME_PATTERN = TIME_PATTERN
     
     # Telegram quiz result pattern
     QUIZ_RESULT_PATTERN = re.compile(
         r'^\s*(?:🥇|🥈|🥉|\d+\.)\s*(@?\S+|[^\u2013\n]+)\s*\u2013\s*(\d+)\s*\((.*?)\)'
     )
+    # Characters left out of usernames after HTML escaping
+    UNSAFE_USERNAME_PATTERN = re.compile(r'[<>"\'/\\]')
     
     @staticmethod
-    def sanitize_username(username: str) -> str:
-        """Sanitize and validate username."""
-        if not username:
-            return ""
-        
+    def clean_username(username: str) -> str:
+        """Strip the @ and escape a username, without checking its length."""
         # Remove @ symbol if present
         username = username.strip().lstrip('@')
         
@@ -37,10 +118,18 @@ class DataValidator:
         username = html.escape(username)
         
         # Remove any remaining invalid characters
-        username = re.sub(r'[<>"\'/\\]', '', username)
+        return DataValidator.UNSAFE_USERNAME_PATTERN.sub('', username)
+    
+    @staticmethod
+    def sanitize_username(username: str) -> str:
+        """Sanitize and validate username."""
+        if not username:
+            return ""
+        
+        username = DataValidator.clean_username(username)
         
         # Validate length
-        if len(username) < 3 or len(username) > 30:
+        if not Config.MIN_USERNAME_LENGTH <= len(username) <= Config.MAX_USERNAME_LENGTH:
             logger.warning(f"Username length invalid: {username}")
             return ""
         
@@ -54,7 +143,7 @@ class DataValidator:
         
         try:
             score = int(score_str)
-            if 0 <= score <= 100:  # Reasonable score range
+            if 0 <= score <= Config.MAX_SCORE:  # Reasonable score range
                 return score
             else:
                 logger.warning(f"Score out of range: {score}")
@@ -69,36 +158,18 @@ class DataValidator:
         if not time_str:
             return None
         
-        time_str = time_str.strip().lower()
-        
         # Check if it matches our expected pattern
-        if not DataValidator.TIME_PATTERN.match(time_str):
+        if not is_valid_time(time_str):
             logger.warning(f"Invalid time format: {time_str}")
             return None
         
-        try:
-            # Parse time string
-            total_seconds = 0.0
-            
-            # Handle minutes
-            min_match = re.search(r'(\d+)\s*min', time_str)
-            if min_match:
-                total_seconds += int(min_match.group(1)) * 60
-            
-            # Handle seconds
-            sec_match = re.search(r'(\d+(?:\.\d+)?)\s*sec', time_str)
-            if sec_match:
-                total_seconds += float(sec_match.group(1))
-            
-            # Validate reasonable time range (0-300 seconds)
-            if 0 <= total_seconds <= 300:
-                return total_seconds
-            else:
-                logger.warning(f"Time out of range: {total_seconds} seconds")
-                return None
-                
-        except ValueError:
-            logger.warning(f"Error parsing time: {time_str}")
+        total_seconds = parse_time_to_seconds(time_str)
+        
+        # Validate reasonable time range (0-300 seconds)
+        if 0 <= total_seconds <= Config.MAX_TIME_SECONDS:
+            return total_seconds
+        else:
+            logger.warning(f"Time out of range: {total_seconds} seconds")
             return None
     
     @staticmethod
@@ -128,6 +199,114 @@ class DataValidator:
             'OriginalLine': line.strip()
         }
     
+    @staticmethod
+    def validate_batch(lines: Sequence[str], first_line: int = 1,
+                       keep_records: bool = True) -> BatchValidation:
+        """Validate a chunk of lines at once instead of line by line.
+
+        Lines are rejected by the rules quiz_parser applies when ingesting:
+        they must look like a result and name a user. The stricter limits
+        of validate_quiz_line only flag lines, which are still valid, so
+        the invalid rate can gate ingestion without dropping real results.
+        Blank lines are skipped and no rejection is logged. The result
+        pattern is matched with one vectorized str.extract, and the field
+        rules then run once per distinct username, score and time string,
+        which repeat across quizzes; the distinct times are converted
+        together by parse_time_series.
+
+        Args:
+            lines: Raw lines, with or without their line endings
+            first_line: Line number of lines[0], used for the samples
+            keep_records: Return the valid results as a DataFrame
+        """
+        import numpy as np
+        import pandas as pd
+
+        text = pd.Series(list(lines), dtype=object)
+        line_numbers = np.arange(first_line, first_line + len(text))
+        parts = text.str.extract(DataValidator.QUIZ_RESULT_PATTERN).to_numpy()
+        matched = pd.notna(parts[:, 0])
+        # Only lines that are not results can be blank
+        blank = np.zeros(len(text), dtype=bool)
+        blank[~matched] = (text[~matched].str.strip() == '').to_numpy()
+
+        codes, distinct = pd.factorize(parts[matched, 0])
+        usernames = [DataValidator.clean_username(name) for name in distinct]
+        names = np.array(usernames, dtype=object)[codes]
+        name_lengths = np.array([len(name) for name in usernames], dtype=np.int64)[codes]
+        # quiz_parser drops a result only if nothing is left of the name
+        unnamed = np.array([not name.strip().replace('@', '') for name in distinct], dtype=bool)[codes]
+        codes, distinct = pd.factorize(parts[matched, 1])
+        scores = np.array([min(int(score), Config.MAX_SCORE + 1) for score in distinct],
+                          dtype=np.int64)[codes]
+        codes, distinct = pd.factorize(parts[matched, 2])
+        seconds = parse_time_series(pd.Series(distinct, dtype=object), strict=True).to_numpy(np.float64)[codes]
+
+        def on_results(failed: np.ndarray) -> np.ndarray:
+            lines_failed = np.zeros(len(text), dtype=bool)
+            lines_failed[matched] = failed
+            return lines_failed
+
+        with np.errstate(invalid='ignore'):
+            failures = {
+                'pattern': ~matched & ~blank,
+                'username': on_results(unnamed),
+                'username_length': on_results((name_lengths < Config.MIN_USERNAME_LENGTH)
+                                              | (name_lengths > Config.MAX_USERNAME_LENGTH)),
+                'score': on_results(scores > Config.MAX_SCORE),
+                'time_format': on_results(np.isnan(seconds)),
+                'time_range': on_results(~((seconds >= 0) & (seconds <= Config.MAX_TIME_SECONDS))),
+            }
+        result = BatchValidation(lines=int((~blank).sum()))
+        remaining = ~blank
+
+        def count_first_failures(rules: Sequence[str], counts: Dict[str, int]) -> None:
+            for rule in rules:
+                failed = failures[rule] & remaining
+                count = int(failed.sum())
+                if count:
+                    counts[rule] = count
+                    result.samples[rule] = line_numbers[failed][:Config.VALIDATION_SAMPLE_LINES].tolist()
+                    remaining[failed] = False
+
+        count_first_failures(VALIDATION_RULES, result.rejections)
+        result.valid = int(remaining.sum())
+        count_first_failures(LIMIT_RULES, result.flags)
+
+        if keep_records:
+            valid = remaining[matched]
+            result.records = pd.DataFrame({
+                'Line': line_numbers[remaining],
+                'Username': names[valid],
+                'Score': scores[valid],
+                'Seconds': seconds[valid],
+                'OriginalLine': text[remaining].str.strip().to_numpy(),
+            })
+        return result
+
+    @staticmethod
+    def validate_file_batch(file_path: Path, offset: int = 0, first_line: int = 1,
+                            chunk_lines: int = Config.VALIDATION_CHUNK_LINES,
+                            keep_records: bool = False) -> BatchValidation:
+        """Batch-validate a file from a byte offset, chunk_lines lines at a time.
+
+        Args:
+            file_path: Quiz export to check
+            offset: Byte offset to start at, e.g. where an incremental run resumes
+            first_line: Line number of the line at offset
+        """
+        result = BatchValidation()
+        with open(file_path, 'rb') as f:
+            f.seek(offset)
+            lines = (raw.decode('utf-8') for raw in f)
+            while True:
+                chunk = list(islice(lines, chunk_lines))
+                if not chunk:
+                    break
+                result.merge(DataValidator.validate_batch(chunk, first_line, keep_records))
+                first_line += len(chunk)
+        return result
+
     @staticmethod
     def validate_file_content(file_path: Path) -> List[Dict[str, Any]]:
         """Validate entire file content and return valid entries."""
@@ -136,28 +315,41 @@ class DataValidator:
             return []
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            
-            valid_entries = []
-            invalid_count = 0
-            
-            for line_num, line in enumerate(lines, 1):
-                entry = DataValidator.validate_quiz_line(line)
-                if entry:
-                    valid_entries.append(entry)
-                else:
-                    invalid_count += 1
-                    if line.strip():  # Only log non-empty lines
-                        logger.debug(f"Invalid line {line_num}: {line.strip()}")
-            
-            logger.info(f"Validation complete: {len(valid_entries)} valid, {invalid_count} invalid entries")
-            return valid_entries
+            result = DataValidator.validate_file_batch(file_path, keep_records=True)
+            logger.info(f"Validation complete: {result.summary()}")
+            if result.records is None:
+                return []
+            return result.records.drop(columns='Line').to_dict(orient='records')
             
         except Exception as e:
             logger.error(f"Error reading file {file_path}: {e}")
             return []
     
+    @staticmethod
+    def validate_repository(repository, totals: Optional[Dict[str, List[float]]] = None) -> int:
+        """Check the per-user totals held by a storage repository.
+        
+        Args:
+            repository: Storage repository, see storage.get_repository
+            totals: Its user_totals() if already read
+        
+        Returns:
+            int: Number of users whose totals are impossible, each logged
+        """
+        if totals is None:
+            totals = repository.user_totals()
+        invalid_count = 0
+        for username, (count, total_score, total_seconds) in totals.items():
+            if (not username or count < 1 or total_score < 0
+                    or total_score > Config.MAX_SCORE * count or total_seconds < 0):
+                invalid_count += 1
+                logger.warning(f"Invalid stored totals for {username}: "
+                               f"{count} quizzes, {total_score} points, {total_seconds} seconds")
+        
+        if invalid_count:
+            logger.warning(f"Repository check found {invalid_count} invalid users")
+        return invalid_count
+    
     @staticmethod
     def sanitize_search_query(query: str) -> str:
         """Sanitize search query to prevent injection."""
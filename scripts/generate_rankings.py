@@ -1,202 +1,505 @@
 import os
-import re
-import pandas as pd
-import random
+import glob
+import hashlib
+import argparse
 import logging
 from pathlib import Path
-from typing import List, Dict, Any
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Iterator, List, Optional, BinaryIO, Sequence
 from datetime import datetime
 
+from utils import Config, atomic_write, display_path, export_to_json, import_from_json
+from quiz_parser import QuizExportParser, block_fingerprint, is_block_start
+from leaderboard_snapshot import write_snapshot
+from metrics import stage, write_generator_metrics
+from quiz_history import QuizHistory
+from storage import BACKENDS, get_repository
+from data_validator import BatchValidation, DataValidator
+from ranking_engine import UserScores, fold_results, merge_totals, rank_leaderboard, totals_to_frame
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def parse_time_to_seconds(time_str: str) -> float:
-    """Converts strings like '1 min 35 sec' or '45.6 sec' to float seconds."""
-    if not time_str or not isinstance(time_str, str):
-        return 0.0
-        
-    time_str = time_str.lower().strip()
-    total_seconds = 0.0
+# Bump when parsing or the persisted state layout changes
+STATE_VERSION = 4
+# Bytes hashed at the start of the file and before the offset to detect rewrites
+CHECKSUM_WINDOW = 4096
+
+def _checksum(f: BinaryIO, start: int, end: int) -> str:
+    """Return the SHA-256 of the byte range [start, end) of an open file."""
+    f.seek(start)
+    return hashlib.sha256(f.read(end - start)).hexdigest()
+
+def _fingerprint(f: BinaryIO, offset: int) -> Dict[str, str]:
+    """Checksum the start of the file and the bytes just before the offset."""
+    return {
+        'head': _checksum(f, 0, min(offset, CHECKSUM_WINDOW)),
+        'tail': _checksum(f, max(0, offset - CHECKSUM_WINDOW), offset),
+    }
+
+def _iter_lines(f: BinaryIO, parser: QuizExportParser, checkpoint: Dict[str, Any]) -> Iterator[str]:
+    """Yield the lines of a binary file from its current position.
+
+    Before every 🥇 line, checkpoint is set to the byte offset and parser
+    position a later run resumes from. The last quiz block, which may still
+    be growing, is therefore always parsed again in full.
+    """
+    offset = f.tell()
+    for raw in f:
+        line = raw.decode('utf-8')
+        if is_block_start(line):
+            checkpoint.update(offset=offset, lines=parser.line_num, quiz_index=parser.quiz_index)
+        offset += len(raw)
+        yield line
+
+def resolve_inputs(input_spec: str) -> List[Path]:
+    """Expand a file, a directory of .txt exports or a glob pattern into files.
+
+    Returns:
+        List[Path]: Matching files in sorted order, empty if nothing matched
+    """
+    path = Path(input_spec)
+    if path.is_dir():
+        return sorted(p for p in path.glob("*.txt") if p.is_file())
+    if path.exists():
+        return [path]
+    return sorted(Path(p) for p in glob.glob(input_spec, recursive=True) if os.path.isfile(p))
+
+def load_ranking_state(state_path: Path) -> Dict[str, Dict[str, Any]]:
+    """Load the persisted per-file states, keyed by resolved source path."""
+    state = import_from_json(state_path)
+    if not state or state.get('version') != STATE_VERSION:
+        if state:
+            logger.info("Ranking state is stale, falling back to full rebuild")
+        return {}
+    return state.get('files', {})
+
+def resumable(file_state: Optional[Dict[str, Any]], input_path: Path) -> bool:
+    """Check whether a file state still describes a prefix of the input.
+
+    Returns False when the file was truncated or rewritten (for example by
+    clean_data.py) and has to be parsed from the start again.
+    """
+    if not file_state:
+        return False
+
+    offset = file_state.get('offset', 0)
+    if input_path.stat().st_size < offset:
+        logger.info(f"{input_path.name} was truncated, re-parsing it in full")
+        return False
+
+    with open(input_path, 'rb') as f:
+        if _fingerprint(f, offset) != file_state.get('fingerprint'):
+            logger.info(f"{input_path.name} was rewritten, re-parsing it in full")
+            return False
+
+    return True
+
+def resumable_states(input_paths: List[Path], file_states: Dict[str, Dict[str, Any]]
+                     ) -> Dict[str, Dict[str, Any]]:
+    """Select the persisted file states that can be resumed.
+
+    A state is also dropped when one of its duplicate blocks repeated a block
+    of a file that is re-parsed in full: that block may be gone, in which
+    case the duplicate has to be counted after all. Files not among the
+    inputs keep their persisted blocks, so duplicates of them stay valid.
+    """
+    states = {}
+    for path in input_paths:
+        source = str(path.resolve())
+        if resumable(file_states.get(source), path):
+            states[source] = file_states[source]
+    others = set(file_states) - {str(path.resolve()) for path in input_paths}
+
+    changed = True
+    while changed:
+        changed = False
+        for source, state in list(states.items()):
+            if any(dup['duplicate_of']['source'] not in states and dup['duplicate_of']['source'] not in others
+                   for dup in state['duplicates']):
+                logger.info(f"{Path(source).name} repeats a quiz of a re-parsed file, re-parsing it in full")
+                del states[source]
+                changed = True
+    return states
+
+def aggregate_file(input_path: Path, file_state: Optional[Dict[str, Any]] = None,
+                   keep_results: bool = False) -> Dict[str, Any]:
+    """Parse one export into per-quiz-block partial sums; the map step of ingestion.
+
+    Runs in a worker process. Resumes from file_state when it still matches
+    the file, so only the last quiz block and appended lines are parsed.
+    Which of the new blocks are kept is decided by fold_blocks.
+
+    Returns:
+        dict: The file state to persist, still holding the previous 'users',
+        'blocks' and 'duplicates' (empty unless it 'resumed'), and the
+        'new_blocks' parsed now with their fingerprint, sums and, with
+        keep_results, their results
+    """
+    resumed = resumable(file_state, input_path)
+    if resumed:
+        users = file_state['users']
+        blocks = file_state['blocks']
+        duplicates = file_state['duplicates']
+        offset = file_state['offset']
+        parser = QuizExportParser(file_state['quiz_index'], file_state['lines'])
+    else:
+        users, blocks, duplicates = {}, {}, []
+        offset = 0
+        parser = QuizExportParser()
+
+    checkpoint = {'offset': offset, 'lines': parser.line_num, 'quiz_index': parser.quiz_index}
+    new_blocks = []
+    with open(input_path, 'rb') as f:
+        f.seek(offset)
+        for block in parser.parse_blocks(_iter_lines(f, parser, checkpoint)):
+            sums: Dict[str, List[float]] = {}
+            new_blocks.append({
+                'fingerprint': block_fingerprint(block.results),
+                'line': block.line,
+                'quiz_index': block.quiz_index,
+                'entries': fold_results(block.results, sums),
+                'users': sums,
+                'results': block.results if keep_results else [],
+            })
+        fingerprint = _fingerprint(f, checkpoint['offset'])
+
+    # Blocks after the checkpoint are re-parsed next time, so never persisted
+    for block in new_blocks:
+        block['pending'] = block['quiz_index'] > checkpoint['quiz_index']
+
+    return {
+        'offset': checkpoint['offset'],
+        'lines': checkpoint['lines'],
+        'quiz_index': checkpoint['quiz_index'],
+        'fingerprint': fingerprint,
+        'users': users,
+        'blocks': blocks,
+        'duplicates': duplicates,
+        'resumed': resumed,
+        'new_blocks': new_blocks,
+    }
+
+def fold_blocks(file_states: Dict[str, Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """Merge the new blocks of every file into its state, dropping repeated quizzes.
+
+    The reduce step of ingestion. A block is a duplicate if its fingerprint
+    matches a block kept before it: persisted blocks come first, then new
+    blocks in input and file order, then the last (pending) block of each
+    file, so a persisted duplicate never refers to a block that may still
+    change. Kept blocks are added to the file's 'users' sums and 'blocks';
+    pending ones go to 'tail_users' and 'tail_results' for this run only.
+
+    Returns:
+        Dict[str, List[Dict[str, Any]]]: The pending duplicates dropped in
+        this run per source; persisted ones are listed in 'duplicates'
+    """
+    owners = {fingerprint: (source, line)
+              for source, state in file_states.items()
+              for fingerprint, line in state['blocks'].items()}
+    for state in file_states.values():
+        state.update(entries=0, results=[], tail_results=[], tail_users={})
+
+    pending_duplicates: Dict[str, List[Dict[str, Any]]] = {}
+    for pending in (False, True):
+        for source, state in file_states.items():
+            for block in state['new_blocks']:
+                if block['pending'] != pending:
+                    continue
+                owner = owners.get(block['fingerprint'])
+                if owner is not None:
+                    duplicate = {
+                        'line': block['line'],
+                        'results': block['entries'],
+                        'duplicate_of': {'source': owner[0], 'line': owner[1]},
+                    }
+                    if pending:
+                        pending_duplicates.setdefault(source, []).append(duplicate)
+                    else:
+                        state['duplicates'].append(duplicate)
+                    continue
+
+                owners[block['fingerprint']] = (source, block['line'])
+                state['entries'] += block['entries']
+                if pending:
+                    merge_totals(block['users'], state['tail_users'])
+                    state['tail_results'].extend(block['results'])
+                else:
+                    merge_totals(block['users'], state['users'])
+                    state['blocks'][block['fingerprint']] = block['line']
+                    state['results'].extend(block['results'])
+
+    for state in file_states.values():
+        del state['new_blocks']
+    return pending_duplicates
+
+def write_duplicate_report(file_states: Dict[str, Dict[str, Any]],
+                           pending_duplicates: Dict[str, List[Dict[str, Any]]],
+                           report_path: Path = Config.DUPLICATE_REPORT) -> int:
+    """Write every quiz block currently dropped as a duplicate to a JSON report.
+
+    Returns:
+        int: Number of duplicate blocks
+    """
+    duplicates = [
+        {'source': display_path(source), **duplicate,
+         'duplicate_of': {**duplicate['duplicate_of'], 'source': display_path(duplicate['duplicate_of']['source'])}}
+        for source, state in file_states.items()
+        for duplicate in state['duplicates'] + pending_duplicates.get(source, [])
+    ]
+    dropped_results = sum(duplicate['results'] for duplicate in duplicates)
+    export_to_json({'blocks': len(duplicates), 'results': dropped_results,
+                    'duplicates': duplicates}, report_path)
+    if duplicates:
+        logger.warning(f"Skipped {len(duplicates)} duplicate quiz blocks ({dropped_results} results), "
+                       f"see {report_path}")
+    return len(duplicates)
+
+def validate_inputs(input_paths: List[Path], file_states: Dict[str, Dict[str, Any]],
+                    report_path: Path = Config.VALIDATION_REPORT) -> BatchValidation:
+    """Batch-validate the lines of every input that this run will parse.
+
+    Resumable files are only checked from their persisted offset. The
+    rejections and flags of each file are logged once and written to a
+    JSON report.
+
+    Returns:
+        BatchValidation: Totals over all inputs, without records
+    """
+    total = BatchValidation()
+    reports = {}
+    for path in input_paths:
+        source = str(path.resolve())
+        file_state = file_states.get(source)
+        if resumable(file_state, path):
+            result = DataValidator.validate_file_batch(path, file_state['offset'], file_state['lines'] + 1)
+        else:
+            result = DataValidator.validate_file_batch(path)
+        if result.rejections or result.flags:
+            logger.info(f"Validated {path}: {result.summary()}")
+        reports[display_path(path)] = result.to_dict()
+        total.merge(result)
+    export_to_json({'invalid_rate': round(total.invalid_rate, 6), 'files': reports}, report_path)
+    return total
+
+def aggregate_files(input_paths: List[Path], file_states: Dict[str, Dict[str, Any]],
+                    workers: int = Config.INGEST_WORKERS, keep_results: bool = False
+                    ) -> Dict[str, Dict[str, Any]]:
+    """Run aggregate_file over every input, in parallel processes when there are several.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: New file states keyed by resolved path, in
+        input order so the merged sums are reproducible
+    """
+    sources = [str(path.resolve()) for path in input_paths]
+    states = [file_states.get(source) for source in sources]
+    keep = [keep_results] * len(input_paths)
+    workers = min(workers, len(input_paths))
+    if workers <= 1:
+        return {source: aggregate_file(path, state, keep_results)
+                for source, path, state in zip(sources, input_paths, states)}
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(sources, pool.map(aggregate_file, input_paths, states, keep)))
+
+def write_csv(final_output: "pd.DataFrame", csv_path: Path) -> None:
+    """Write the leaderboard CSV atomically, so the API never reads a half-written file."""
+    with atomic_write(csv_path) as f:
+        final_output.to_csv(f, index=False)
+    logger.info(f"Leaderboard saved to {csv_path}")
+
+def write_markdown(final_output: "pd.DataFrame", md_path: Path) -> None:
+    """Write the Markdown leaderboard report with a generation timestamp."""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with atomic_write(md_path) as md:
+        md.write(f"# 🏆 Cumulative Quiz Leaderboard\n\n")
+        md.write(f"*Generated on: {timestamp}*\n\n")
+        md.write("| Rank | Username | Quizzes | Avg Accuracy | Avg Time (s) | Final Score | Remark |\n")
+        md.write("| :--- | :--- | :--- | :--- | :--- | :--- | :--- |\n")
+        md.writelines(
+            f"| {int(row.Rank)} | {row.Username} | {int(row.Quizzes_Participated)} | {row.Avg_Points:.2f} | {row.Avg_Time:.2f} | {row.Final_Score:.2f} | {row.Remark} |\n"
+            for row in final_output.itertuples(index=False)
+        )
+    logger.info(f"Markdown report generated at {md_path}")
+
+def write_outputs(final_output: "pd.DataFrame") -> None:
+    """Write the leaderboard CSV, columnar snapshot and Markdown report."""
+    # Get script directory for output paths
+    script_dir = Path(__file__).parent
+    csv_path = script_dir.parent / "data" / "cumulative_leaderboard.csv"
+    md_path = script_dir.parent / "docs" / "CumulativeLeaderboard.md"
     
-    try:
-        # Handle 'X min Y sec'
-        min_match = re.search(r'(\d+)\s*min', time_str)
-        if min_match:
-            total_seconds += int(min_match.group(1)) * 60
-        
-        # Handle 'X.X sec' or 'X sec'
-        sec_match = re.search(r'(\d+(?:\.\d+)?)\s*sec', time_str)
-        if sec_match:
-            total_seconds += float(sec_match.group(1))
-            
-        return total_seconds
-    except (ValueError, AttributeError) as e:
-        logger.warning(f"Error parsing time string '{time_str}': {e}")
-        return 0.0
-
-def generate_rankings(input_file: str) -> bool:
-    """Generate rankings from input file and save outputs.
+    # Ensure output directories exist
+    csv_path.parent.mkdir(exist_ok=True)
+    md_path.parent.mkdir(exist_ok=True)
+    
+    write_csv(final_output, csv_path)
+    
+    # Save typed columnar snapshot for the API
+    write_snapshot(final_output, csv_path.with_suffix(".npy"))
     
+    write_markdown(final_output, md_path)
+
+def format_announcement(podium: List[Dict[str, Any]], ranks: Dict[str, Optional[int]],
+                        participants: int) -> str:
+    """Plain-text podium and single ranks for posting in the quiz group."""
+    lines = [f"🏆 Top {len(podium)} of {participants} participants"] if podium else []
+    lines += [f"{row['Rank']}. {row['Username']} – {row['Final_Score']:.2f} "
+              f"({row['Quizzes_Participated']} quizzes, {row['Avg_Points']:.2f} avg)"
+              for row in podium]
+    lines += [f"{username}: rank {rank} of {participants}" if rank else f"{username}: not ranked"
+              for username, rank in ranks.items()]
+    return "\n".join(lines)
+
+def generate_rankings(input_file: str, incremental: bool = False,
+                      state_file: Optional[str] = None,
+                      workers: int = Config.INGEST_WORKERS,
+                      history_db: Optional[str] = None,
+                      backend: str = Config.STORAGE_BACKEND,
+                      validate: bool = False,
+                      top: Optional[int] = None,
+                      rank_users: Sequence[str] = ()) -> bool:
+    """Generate rankings from one or more export files and save outputs.
+
+    Each file is parsed into per-quiz partial sums in its own worker process
+    and the partials are merged into one leaderboard, skipping quiz blocks
+    that repeat an earlier one (listed in Config.DUPLICATE_REPORT). The byte
+    offset consumed so far, the partial sums and the block fingerprints of
+    every file are persisted after each run; in incremental mode a rerun
+    only parses the last quiz block and lines appended since then. The last
+    block is counted for this run but not persisted, in case the paste is
+    still in progress. Newly parsed results
+    are also recorded per quiz in the history store unless history_db is ''.
+    With the sqlite backend the results are always recorded and the
+    leaderboard is ranked from the stored totals, unless
+    DataValidator.validate_repository finds impossible ones, which fails
+    the run before anything is written. With validate, the lines
+    about to be parsed are batch-validated first and nothing is ingested if
+    more than Config.VALIDATION_MAX_INVALID_RATE of the result lines fail
+    (see Config.VALIDATION_REPORT). With top or rank_users only the podium
+    and those users' ranks are computed and printed, without the full sort
+    or writing the leaderboard files.
+
     Args:
-        input_file: Path to the raw quiz data file
-        
+        input_file: Raw quiz data file, directory of .txt exports or glob pattern
+        incremental: Resume from the persisted state when it is still valid
+        state_file: Path of the incremental state (defaults to Config.RANKING_STATE_FILE)
+        workers: Maximum number of parsing processes
+        history_db: Path of the quiz history store (defaults to
+            Config.HISTORY_DB, '' disables it for the files backend)
+        backend: Storage backend name, see storage.BACKENDS
+        validate: Check the new lines with DataValidator before ingesting them
+        top: Print the first top places instead of writing the full leaderboard
+        rank_users: Print the ranks of these usernames instead of writing it
+
     Returns:
         bool: True if successful, False otherwise
     """
-    input_path = Path(input_file)
-    if not input_path.exists():
-        logger.error(f"Input file not found: {input_path}")
+    input_paths = resolve_inputs(input_file)
+    if not input_paths:
+        logger.error(f"Input file not found: {input_file}")
         return False
 
+    state_path = Path(state_file) if state_file else Config.RANKING_STATE_FILE
+    # Seconds per stage, saved for /metrics after a successful run
+    timings: Dict[str, float] = {}
+
     try:
-        logger.info(f"Processing quiz data from: {input_path}")
-        with open(input_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-
-        user_data: List[Dict[str, Any]] = []
-        
-        # Regex for results line: 🥇 @user – 5 (30.3 sec) or  4. @user – 5 (35.5 sec)
-        # Note: Using \u2013 for the dash (–)
-        result_pattern = re.compile(r'^\s*(?:🥇|🥈|🥉|\d+\.)\s*(@\S+|[^\u2013\n]+)\s*\u2013\s*(\d+)\s*\((.*?)\)')
-
-        for line_num, line in enumerate(lines, 1):
-            line = line.strip()
-            if not line:
-                continue
-                
-            match = result_pattern.match(line)
-            if match:
-                try:
-                    username = match.group(1).strip().replace('@', '')
-                    score = int(match.group(2))
-                    time_raw = match.group(3)
-                    time_sec = parse_time_to_seconds(time_raw)
-                    
-                    # Validate data
-                    if username and score >= 0 and time_sec >= 0:
-                        user_data.append({
-                            'Username': username,
-                            'Score': score,
-                            'Seconds': time_sec
-                        })
-                    else:
-                        logger.warning(f"Invalid data on line {line_num}: {line}")
-                except (ValueError, AttributeError) as e:
-                    logger.warning(f"Error parsing line {line_num}: '{line}' - {e}")
-                    continue
+        repository = get_repository(backend, QuizHistory(Path(history_db)) if history_db else None)
+        record = history_db != '' or repository.stores_results
+        if history_db == '' and repository.stores_results:
+            logger.warning(f"The {backend} backend stores every result; ignoring disabled history")
+
+        # Loaded even for full runs, so the states of other exports are kept
+        persisted = load_ranking_state(state_path)
+        if record and not repository.history.db_path.exists() and persisted:
+            logger.info("Quiz history store is missing, re-parsing every file")
+            persisted = {}
+        file_states = persisted if incremental else {}
+        file_states = resumable_states(input_paths, file_states)
+        logger.info(f"Processing quiz data from {len(input_paths)} file(s): {input_file}")
+
+        if validate:
+            with stage('validate', 'generator', timings):
+                validation = validate_inputs(input_paths, file_states)
+            if validation.invalid_rate > Config.VALIDATION_MAX_INVALID_RATE:
+                logger.error(f"{validation.invalid_results} of {validation.results} result lines failed "
+                             f"validation, more than {Config.VALIDATION_MAX_INVALID_RATE:.1%}; "
+                             f"see {Config.VALIDATION_REPORT}")
+                return False
+
+        # Parsing, reading and block fingerprints run in the worker processes
+        with stage('parse', 'generator', timings):
+            new_states = aggregate_files(input_paths, file_states, workers, keep_results=record)
+        with stage('dedup', 'generator', timings):
+            pending_duplicates = fold_blocks(new_states)
 
-        if not user_data:
+        users: Dict[str, List[float]] = {}
+        tail_users: Dict[str, List[float]] = {}
+        entries = 0
+        for source, file_state in new_states.items():
+            entries += file_state.pop('entries')
+            resumed = file_state.pop('resumed')
+            results = file_state.pop('results')
+            tail_results = file_state.pop('tail_results')
+            if record:
+                # Recorded before the state is saved, so a failure is retried
+                with stage('record', 'generator', timings):
+                    repository.record_results(source, results, reset=not resumed,
+                                              pending=tail_results)
+            with stage('aggregate', 'generator', timings):
+                merge_totals(file_state['users'], users)
+                merge_totals(file_state.pop('tail_users'), tail_users)
+        logger.info(f"Found {entries} new valid quiz entries")
+        write_duplicate_report(new_states, pending_duplicates)
+
+        # Saved after full runs too, so it always matches the history store;
+        # exports not in this run keep their offsets and checksums
+        sources = {str(path.resolve()) for path in input_paths}
+        saved = {source: state for source, state in persisted.items() if source not in sources}
+        saved.update(new_states)
+        export_to_json({'version': STATE_VERSION, 'files': saved}, state_path)
+
+        with stage('aggregate', 'generator', timings):
+            if repository.stores_results:
+                # The store also holds exports ingested by earlier runs
+                users = repository.user_totals()
+                invalid_users = DataValidator.validate_repository(repository, users)
+            else:
+                # The last quiz block of each file counts for this run only
+                merge_totals(tail_users, users)
+
+        if not users:
             logger.error("No valid quiz data found in input file")
             return False
+        if repository.stores_results and invalid_users:
+            # Never publish a leaderboard ranked from impossible totals
+            logger.error(f"{invalid_users} users have impossible totals in {repository.history.db_path}; "
+                         f"not writing the leaderboard")
+            return False
 
-        logger.info(f"Found {len(user_data)} valid quiz entries")
-        df = pd.DataFrame(user_data)
-        
-        # Aggregation
-        agg_df = df.groupby('Username').agg(
-            Quizzes_Participated=('Score', 'count'),
-            Total_Score=('Score', 'sum'),
-            Total_Seconds=('Seconds', 'sum')
-        ).reset_index()
-        
-        agg_df['Avg_Points'] = agg_df['Total_Score'] / agg_df['Quizzes_Participated']
-        agg_df['Avg_Time'] = agg_df['Total_Seconds'] / agg_df['Quizzes_Participated']
-        
-        # Normalization factors with safety checks
-        max_participation = agg_df['Quizzes_Participated'].max()
-        max_avg_points = agg_df['Avg_Points'].max()
-        
-        # Weighted Scoring (50/25/25) with safety checks for zero values
-        # 50% Participation: (User Quizzes / Max Quizzes) * 50
-        if max_participation > 0:
-            agg_df['Participation_Score'] = (agg_df['Quizzes_Participated'] / max_participation) * 50
-        else:
-            agg_df['Participation_Score'] = 0.0
+        if top is not None or rank_users:
+            # Announcements need no full sort; the next full run writes the files
+            with stage('score', 'generator', timings):
+                scores = UserScores(users)
+                podium = scores.top(top or 0)
+                ranks = {username: scores.rank_of(username.lstrip('@')) for username in rank_users}
+            print(format_announcement(podium, ranks, len(scores)))
+            write_generator_metrics(timings, len(scores))
+            logger.info(f"Ranked {len(scores)} participants without a full export in "
+                        + ", ".join(f"{name} {seconds:.3f}s" for name, seconds in timings.items()))
+            return True
 
-        # 25% Accuracy (Avg Points): (User Avg Points / Max Avg Points) * 25
-        if max_avg_points > 0:
-            agg_df['Accuracy_Score'] = (agg_df['Avg_Points'] / max_avg_points) * 25
-        else:
-            agg_df['Accuracy_Score'] = 0.0
-
-        # 25% Speed: 25 pts for <50s, otherwise (50 / User Avg Time) * 25
-        def calculate_speed_score(row):
-            if row['Avg_Time'] <= 50:
-                return 25.0
-            return (50 / row['Avg_Time']) * 25
-
-        agg_df['Speed_Score'] = agg_df.apply(calculate_speed_score, axis=1)
-        
-        agg_df['Final_Score'] = agg_df['Participation_Score'] + agg_df['Accuracy_Score'] + agg_df['Speed_Score']
-        
-        # Seed for random tie-breaker
-        random.seed(42)
-        agg_df['Random_Rank'] = [random.random() for _ in range(len(agg_df))]
-        
-        # Sort by Final_Score (DESC), then Tie-breakers:
-        # 1. Accuracy (Avg_Points) DESC
-        # 2. Speed (Avg_Time) ASC
-        # 3. Participation DESC
-        # 4. Random
-        agg_df = agg_df.sort_values(
-            by=['Final_Score', 'Avg_Points', 'Avg_Time', 'Quizzes_Participated', 'Random_Rank'],
-            ascending=[False, False, True, False, True]
-        )
-        
-        # Final Rank assignment
-        agg_df['Rank'] = range(1, len(agg_df) + 1)
-        
-        # Assign Remarks based on Final_Score
-        def get_remark(score):
-            if score >= 40:
-                return "እግዚአብሔር ያክብራችሁ በርቱ🥰"
-            elif 20 <= score < 40:
-                return "እንዴ በርቱ እንጂ አሁን F ላይ ናችሁ፤ በቀጣይ NG ነው የሚሆነው🤭"
-            else:
-                return "እናንተማ እያውደለደላችሁ ነው፤ ሥራህን አውቃለሁ፤ በራድ ወይም ትኩስ እንዳልሆንህ፤ በራድ ወይም ትኩስ ብትሆንስ መልካም በሆነ ነበር። እንዲሁ ለዘብተኛ ስለሆንህ በራድም ወይም ትኩስ ስላልሆንህ ከአፌ ልተፋህ ነው። የተባለው ለናንተ ነው የሚመስለው😂"
-
-        agg_df['Remark'] = agg_df['Final_Score'].apply(get_remark)
-
-        # Reorder columns for output
-        final_output = agg_df[
-            ['Rank', 'Username', 'Quizzes_Participated', 'Avg_Points', 'Avg_Time', 'Final_Score', 'Remark']
-        ]
-        
-        # Round numerical values for cleaner output
-        final_output = final_output.round({
-            'Avg_Points': 2,
-            'Avg_Time': 1,
-            'Final_Score': 2
-        })
-        
-        # Get script directory for output paths
-        script_dir = Path(__file__).parent
-        csv_path = script_dir.parent / "data" / "cumulative_leaderboard.csv"
-        md_path = script_dir.parent / "docs" / "CumulativeLeaderboard.md"
-        
-        # Ensure output directories exist
-        csv_path.parent.mkdir(exist_ok=True)
-        md_path.parent.mkdir(exist_ok=True)
-        
-        # Save CSV
-        final_output.to_csv(csv_path, index=False)
-        logger.info(f"Leaderboard saved to {csv_path}")
-        
-        # Save Markdown with timestamp
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        with open(md_path, 'w', encoding='utf-8') as md:
-            md.write(f"# 🏆 Cumulative Quiz Leaderboard\n\n")
-            md.write(f"*Generated on: {timestamp}*\n\n")
-            md.write("| Rank | Username | Quizzes | Avg Accuracy | Avg Time (s) | Final Score | Remark |\n")
-            md.write("| :--- | :--- | :--- | :--- | :--- | :--- | :--- |\n")
-            for _, row in final_output.iterrows():
-                md.write(f"| {int(row['Rank'])} | {row['Username']} | {int(row['Quizzes_Participated'])} | {row['Avg_Points']:.2f} | {row['Avg_Time']:.2f} | {row['Final_Score']:.2f} | {row['Remark']} |\n")
-        
-        logger.info(f"Markdown report generated at {md_path}")
-        logger.info(f"Successfully processed {len(final_output)} participants")
+        with stage('score', 'generator', timings):
+            final_output = rank_leaderboard(totals_to_frame(users))
+        with stage('write', 'generator', timings):
+            write_outputs(final_output)
+        write_generator_metrics(timings, len(final_output))
+        logger.info(f"Successfully processed {len(final_output)} participants in "
+                    + ", ".join(f"{name} {seconds:.3f}s" for name, seconds in timings.items()))
         return True
-        
+
     except Exception as e:
         logger.error(f"Error generating rankings: {e}")
         return False
@@ -204,9 +507,33 @@ def generate_rankings(input_file: str) -> bool:
 if __name__ == "__main__":
     script_dir = Path(__file__).parent
     data_file = script_dir.parent / "data" / "quizRankData.txt"
+
+    parser = argparse.ArgumentParser(description="Generate the cumulative quiz leaderboard")
+    parser.add_argument("input_file", nargs="?", default=str(data_file),
+                        help="Raw quiz data file, directory of exports or quoted glob "
+                             "(default: data/quizRankData.txt)")
+    parser.add_argument("--full", action="store_true",
+                        help="Ignore the incremental state and re-parse every file")
+    parser.add_argument("--workers", type=int, default=Config.INGEST_WORKERS,
+                        help="Maximum number of parsing processes (default: CPU count)")
+    parser.add_argument("--no-history", action="store_true",
+                        help="Do not record per-quiz results in the history store")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=Config.STORAGE_BACKEND,
+                        help="Storage backend (default: STORAGE_BACKEND or 'files')")
+    parser.add_argument("--validate", action="store_true",
+                        help="Validate the new lines first and stop if too many result lines are invalid")
+    parser.add_argument("--top", type=int, metavar="K",
+                        help="Only print the top K places, without sorting and writing the full leaderboard")
+    parser.add_argument("--rank", action="append", default=[], metavar="USERNAME",
+                        help="Only print this user's rank (repeatable), like --top")
+    args = parser.parse_args()
     
     logger.info("Starting ranking generation process...")
-    success = generate_rankings(str(data_file))
+    success = generate_rankings(args.input_file, incremental=not args.full,
+                                workers=args.workers,
+                                history_db='' if args.no_history else None,
+                                backend=args.backend, validate=args.validate,
+                                top=args.top, rank_users=args.rank)
     
     if success:
         logger.info("Ranking generation completed successfully!")
@@ -0,0 +1,103 @@
+"""
+HTTP caching helpers for the Arat Kilo Gibi Gubae Quiz API.
+Precomputes compressed encodings of a response body once per leaderboard
+version and implements ETag / Last-Modified revalidation and Accept-Encoding
+negotiation.
+"""
+
+import gzip
+import hashlib
+import logging
+from datetime import datetime
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional
+
+try:
+    import brotli
+except ImportError:  # Optional: brotli responses are skipped without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 9
+# Server preference when the client accepts several encodings equally
+ENCODING_PREFERENCE = ('br', 'gzip', 'identity')
+
+
+def compress_variants(body: bytes) -> Dict[str, bytes]:
+    """Return the body under every supported content-coding, keyed by name."""
+    variants = {
+        'identity': body,
+        'gzip': gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0),
+    }
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, quality=BROTLI_QUALITY)
+    return variants
+
+
+def make_etags(body: bytes, encodings) -> Dict[str, str]:
+    """Strong ETags per encoding, derived from the identity body's hash."""
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    return {
+        encoding: f'"{digest}"' if encoding == 'identity' else f'"{digest}-{encoding}"'
+        for encoding in encodings
+    }
+
+
+def http_date(moment: datetime) -> str:
+    """Format an aware datetime as an IMF-fixdate for Last-Modified."""
+    return format_datetime(moment, usegmt=True)
+
+
+def etag_matches(if_none_match: str, etags) -> bool:
+    """Weak comparison of an If-None-Match header against our ETags."""
+    if if_none_match.strip() == '*':
+        return True
+    candidates = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+    return any(tag in candidates for tag in etags)
+
+
+def not_modified_since(if_modified_since: str, last_modified: datetime) -> bool:
+    """True if the resource has not changed since the If-Modified-Since date."""
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        return False
+    # HTTP dates have one-second resolution
+    return last_modified.replace(microsecond=0) <= since
+
+
+def select_encoding(accept_encoding: Optional[str], available) -> str:
+    """Pick the best available content-coding for an Accept-Encoding header."""
+    if not accept_encoding:
+        return 'identity'
+
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        name = name.strip().lower()
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name] = quality
+
+    def weight(encoding: str) -> float:
+        if encoding in weights:
+            return weights[encoding]
+        if '*' in weights:
+            return weights['*']
+        # identity is acceptable unless explicitly refused
+        return 1.0 if encoding == 'identity' else 0.0
+
+    best = max(
+        (encoding for encoding in ENCODING_PREFERENCE if encoding in available),
+        key=lambda encoding: (weight(encoding), -ENCODING_PREFERENCE.index(encoding)),
+    )
+    return best if weight(best) > 0 else 'identity'
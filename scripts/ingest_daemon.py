@@ -0,0 +1,372 @@
+"""
+Watch-folder ingestion for the Arat Kilo Gibi Gubae Quiz System.
+Watches an inbox directory for quiz exports and, once a burst of writes has
+settled, runs each changed export through one in-memory pipeline: metadata
+lines are stripped, the lines are batch-validated, parsed and de-duplicated
+against every quiz already in the history store, and the results are
+recorded there. Only the users in those exports are then re-ranked in a
+RankTracker, and the leaderboard CSV, snapshot and Markdown report are
+republished atomically. Uses inotify (through ctypes) on Linux and polls
+file stats elsewhere.
+
+The history store is the only source of truth, so the daemon needs the
+sqlite storage backend; the files backend ranks from the generator's state
+file instead, and both would overwrite the same leaderboard files.
+
+Run next to the API with:
+    STORAGE_BACKEND=sqlite python scripts/ingest_daemon.py [--inbox data/inbox] [--poll]
+"""
+
+import os
+import time
+import ctypes
+import ctypes.util
+import select
+import struct
+import logging
+import argparse
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+from clean_data import remove_metadata_lines
+from data_validator import DataValidator
+from generate_rankings import write_outputs
+from metrics import stage, write_generator_metrics
+from quiz_history import QuizHistory
+from quiz_parser import QuizBlock, QuizExportParser, QuizResult, block_fingerprint
+from rank_tracker import RankTracker
+from ranking_engine import OUTPUT_COLUMNS, REMARKS
+from storage import LeaderboardRepository, get_repository
+from utils import Config, display_path, export_to_json
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# inotify(7) flags and the fixed part of each event record
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+def is_export(name: str) -> bool:
+    """True for the .txt exports of the inbox, skipping hidden and editor temp files."""
+    return name.endswith('.txt') and not name.startswith(('.', '~'))
+
+
+class InotifyWatcher:
+    """Reports files closed after writing, or moved into a directory, via Linux inotify."""
+
+    def __init__(self, directory: Path):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            error = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(error, f"Cannot watch {directory}")
+        self._fd = fd
+
+    def wait(self, timeout: Optional[float]) -> Set[str]:
+        """Names of the files changed, waiting up to timeout seconds for the first."""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        names = set()
+        offset = 0
+        while offset < len(data):
+            *_, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if name:
+                names.add(os.fsdecode(name))
+        return names
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """Reports files whose size or modification time changed, by polling."""
+
+    def __init__(self, directory: Path, interval: float = Config.INBOX_POLL_SECONDS):
+        self.directory = directory
+        self.interval = interval
+        self._stats = self._scan()
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        stats = {}
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.is_file():
+                    stat = entry.stat()
+                    stats[entry.name] = (stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                continue
+        return stats
+
+    def wait(self, timeout: Optional[float]) -> Set[str]:
+        """Names of the files changed, waiting up to timeout seconds for the first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            stats = self._scan()
+            changed = {name for name, stat in stats.items() if self._stats.get(name) != stat}
+            self._stats = stats
+            if changed:
+                return changed
+            remaining = self.interval if deadline is None else deadline - time.monotonic()
+            if remaining <= 0:
+                return set()
+            time.sleep(min(self.interval, remaining))
+
+    def close(self) -> None:
+        pass
+
+
+Watcher = Union[InotifyWatcher, PollingWatcher]
+
+
+def open_watcher(directory: Path, poll: bool = False) -> Watcher:
+    """Watch directory with inotify where available, otherwise by polling."""
+    if not poll:
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError, TypeError) as e:
+            logger.warning(f"inotify unavailable ({e}), polling {directory} instead")
+    return PollingWatcher(directory)
+
+
+def collect_changes(watcher: Watcher, timeout: Optional[float] = None,
+                    debounce: float = Config.INBOX_DEBOUNCE_SECONDS,
+                    max_delay: float = Config.INBOX_MAX_DELAY_SECONDS) -> Set[str]:
+    """Wait for changed files, then until writes pause for debounce seconds.
+
+    A burst is cut off max_delay seconds after its first change, so a file
+    that keeps being written is still picked up promptly.
+    """
+    names = watcher.wait(timeout)
+    if not names:
+        return names
+    deadline = time.monotonic() + max_delay
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        more = watcher.wait(min(debounce, remaining))
+        if not more:
+            break
+        names |= more
+    return names
+
+
+def leaderboard_frame(records: List[Dict[str, Any]]) -> "pd.DataFrame":
+    """Ranked records as the DataFrame rank_leaderboard returns, for write_outputs."""
+    import pandas as pd
+
+    frame = pd.DataFrame(records, columns=OUTPUT_COLUMNS)
+    frame['Remark'] = pd.Categorical(frame['Remark'], categories=REMARKS)
+    return frame
+
+
+class IngestDaemon:
+    """Ingests the exports dropped into an inbox and republishes the leaderboard.
+
+    Every export is re-read in full when it changes and its results replace
+    the ones recorded for it before, so editing or re-saving a file is safe.
+    A quiz block that the history store already holds for another source,
+    whether an inbox export or a file generate_rankings recorded, is
+    skipped. When an export loses blocks that others skipped for it, those
+    exports are ingested again. Exports removed from the inbox keep their
+    recorded results.
+
+    Raises:
+        ValueError: If the repository does not store results (the files backend)
+    """
+
+    def __init__(self, inbox: Path = Config.INBOX_DIR,
+                 repository: Optional[LeaderboardRepository] = None, poll: bool = False):
+        self.inbox = Path(inbox)
+        self.repository = repository or get_repository()
+        if not self.repository.stores_results:
+            raise ValueError("The ingest daemon ranks from the history store and needs "
+                             "STORAGE_BACKEND=sqlite")
+        self.history: QuizHistory = self.repository.history
+        self.poll = poll
+        self.tracker: Optional[RankTracker] = None
+        # Usernames of each export, and the blocks it skipped as held by another source
+        self._usernames: Dict[str, Set[str]] = {}
+        self._skipped: Dict[str, Set[str]] = {}
+        self._stop = threading.Event()
+
+    def _unique_results(self, source: str, blocks: List[QuizBlock]) -> Tuple[List[QuizResult], int, Set[str]]:
+        """Keep the blocks no other source holds.
+
+        Returns:
+            The results of the kept blocks, the number of skipped blocks, and
+            the fingerprints the source held before but no longer does
+        """
+        fingerprints = [block_fingerprint(block.results) for block in blocks]
+        held = self.history.block_sources(fingerprints, exclude_source=source)
+        kept = set()
+        skipped = set()
+        results = []
+        for block, fingerprint in zip(blocks, fingerprints):
+            if fingerprint in held:
+                skipped.add(fingerprint)
+            elif fingerprint not in kept:
+                kept.add(fingerprint)
+                results.extend(block.results)
+        lost = self.history.source_fingerprints(source) - kept
+        self._skipped[source] = skipped
+        return results, len(blocks) - len(kept), lost
+
+    def ingest_export(self, path: Path, timings: Dict[str, float],
+                      reports: Dict[str, Dict[str, Any]], lost: Set[str]) -> Set[str]:
+        """Clean, validate, parse, de-duplicate and record one export.
+
+        Args:
+            lost: Collects the block fingerprints the export no longer holds
+
+        Returns:
+            Set[str]: Users whose totals may have changed; empty if the export
+            failed validation
+        """
+        source = str(path.resolve())
+        with stage('clean', 'ingest', timings):
+            with open(path, 'r', encoding='utf-8') as f:
+                lines = list(remove_metadata_lines(f))
+        with stage('validate', 'ingest', timings):
+            validation = DataValidator.validate_batch(lines, keep_records=False)
+        reports[display_path(path)] = validation.to_dict()
+        # Only lines the parser would drop anyway are invalid; flagged lines are ingested
+        if validation.invalid_rate > Config.VALIDATION_MAX_INVALID_RATE:
+            logger.error(f"Not ingesting {path}: {validation.summary()}")
+            return set()
+        if validation.rejections or validation.flags:
+            logger.info(f"Validated {path}: {validation.summary()}")
+
+        with stage('parse', 'ingest', timings):
+            blocks = list(QuizExportParser().parse_blocks(lines))
+        with stage('dedup', 'ingest', timings):
+            results, duplicates, dropped = self._unique_results(source, blocks)
+        if duplicates:
+            logger.warning(f"Skipped {duplicates} duplicate quiz blocks in {path}")
+        with stage('record', 'ingest', timings):
+            self.repository.record_results(source, results, reset=True)
+        lost |= dropped
+
+        usernames = {result.username for result in results}
+        affected = usernames | self._usernames.get(source, set())
+        self._usernames[source] = usernames
+        logger.info(f"Ingested {len(results)} results of {len(blocks) - duplicates} quizzes from {path}")
+        return affected
+
+    def ingest_exports(self, paths: List[Path], timings: Dict[str, float]) -> Set[str]:
+        """Ingest exports, then again any export skipping a block its holder lost.
+
+        Returns:
+            Set[str]: Users whose totals may have changed
+        """
+        reports: Dict[str, Dict[str, Any]] = {}
+        affected: Set[str] = set()
+        while paths:
+            lost: Set[str] = set()
+            for path in paths:
+                if path.is_file():
+                    affected |= self.ingest_export(path, timings, reports, lost)
+            # An export skipped those blocks as duplicates, so it now has to count them
+            paths = sorted(Path(source) for source, skipped in self._skipped.items() if skipped & lost)
+            for path in paths:
+                logger.info(f"{path.name} repeats a quiz that is no longer held elsewhere, re-ingesting it")
+        if reports:
+            export_to_json({'files': reports}, Config.VALIDATION_REPORT)
+        return affected
+
+    def process(self, names: Set[str]) -> bool:
+        """Ingest the changed exports, re-rank their users and publish.
+
+        Returns:
+            bool: True if a new leaderboard was published
+        """
+        start = time.perf_counter()
+        timings: Dict[str, float] = {}
+        affected = self.ingest_exports([self.inbox / name for name in sorted(names)], timings)
+        if not affected:
+            return False
+
+        with stage('score', 'ingest', timings):
+            totals = self.history.user_totals(affected)
+            changed = self.tracker.assign({username: totals.get(username) for username in affected})
+        self.publish(timings)
+        logger.info(f"Re-ranked {changed} of {len(self.tracker)} participants and published in "
+                    f"{time.perf_counter() - start:.3f}s")
+        return True
+
+    def publish(self, timings: Dict[str, float]) -> None:
+        """Atomically rewrite the leaderboard files from the tracker."""
+        with stage('write', 'ingest', timings):
+            records = self.tracker.records()
+            write_outputs(leaderboard_frame(records))
+        write_generator_metrics(timings, len(records))
+
+    def start(self) -> None:
+        """Ingest every export already in the inbox and publish the leaderboard."""
+        self.inbox.mkdir(parents=True, exist_ok=True)
+        timings: Dict[str, float] = {}
+        self.ingest_exports([self.inbox / name for name in sorted(filter(is_export, os.listdir(self.inbox)))],
+                            timings)
+        with stage('score', 'ingest', timings):
+            self.tracker = RankTracker(self.history.user_totals())
+        if len(self.tracker):
+            self.publish(timings)
+        logger.info(f"Ranked {len(self.tracker)} participants; watching {self.inbox}")
+
+    def run(self) -> None:
+        """Ingest the exports in the inbox, then every change, until stop() is called."""
+        self.inbox.mkdir(parents=True, exist_ok=True)
+        # Watch before the first scan, so no export landing meanwhile is missed
+        watcher = open_watcher(self.inbox, self.poll)
+        try:
+            self.start()
+            while not self._stop.is_set():
+                names = set(filter(is_export, collect_changes(watcher, timeout=Config.INBOX_MAX_DELAY_SECONDS)))
+                if not names:
+                    continue
+                try:
+                    self.process(names)
+                except Exception as e:
+                    logger.error(f"Error ingesting {', '.join(sorted(names))}: {e}")
+        finally:
+            watcher.close()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest quiz exports dropped into an inbox directory")
+    parser.add_argument("--inbox", type=Path, default=Config.INBOX_DIR,
+                        help="Directory to watch for .txt exports (default: data/inbox)")
+    parser.add_argument("--history-db", type=Path, default=Config.HISTORY_DB,
+                        help="Quiz history store the results are recorded in")
+    parser.add_argument("--poll", action="store_true",
+                        help="Poll the inbox instead of using inotify")
+    args = parser.parse_args()
+
+    try:
+        daemon = IngestDaemon(args.inbox, get_repository(history=QuizHistory(args.history_db)),
+                              poll=args.poll)
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        daemon.stop()
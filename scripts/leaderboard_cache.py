@@ -0,0 +1,215 @@
+"""
+In-memory leaderboard cache for the Arat Kilo Gibi Gubae Quiz API.
+Keeps the serialized /leaderboard response ready to send and rebuilds it
+only when one of the underlying data files changes on disk.
+"""
+
+import json
+import os
+import asyncio
+import threading
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from http_caching import compress_variants, make_etags
+from leaderboard_index import LeaderboardIndex
+from metrics import CACHE_REQUESTS, stage
+from utils import Config
+
+logger = logging.getLogger(__name__)
+
+# (st_mtime_ns, st_size, st_ino) for every watched file, None if missing
+FileKey = Optional[Tuple[int, int, int]]
+CacheKey = Tuple[FileKey, ...]
+
+
+def file_key(path: Path) -> FileKey:
+    """Return the (mtime, size, inode) triple identifying a file version."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def serialize_json(payload: Dict[str, Any]) -> bytes:
+    """Encode a response payload as compact UTF-8 JSON."""
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def serialize_leaderboard(records: List[Dict[str, Any]], last_updated: str = "Unknown") -> bytes:
+    """Serialize the /leaderboard response envelope to UTF-8 JSON bytes."""
+    return serialize_json({
+        "status": "success",
+        "data": records,
+        "total_participants": len(records),
+        "last_updated": last_updated
+    })
+
+
+def key_last_modified(key: CacheKey) -> Optional[datetime]:
+    """Newest modification time among the existing source files of a key."""
+    mtimes = [file_version[0] for file_version in key if file_version is not None]
+    if not mtimes:
+        return None
+    return datetime.fromtimestamp(max(mtimes) / 1e9, tz=timezone.utc)
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    """One immutable version of the leaderboard and its serialized response.
+
+    variants holds the body under each content-coding and etags the matching
+    strong ETag, both computed once when the version is built.
+    """
+    key: CacheKey
+    records: List[Dict[str, Any]]
+    body: bytes
+    index: LeaderboardIndex
+    last_modified: Optional[datetime]
+    variants: Dict[str, bytes]
+    etags: Dict[str, str]
+
+    @property
+    def participants(self) -> int:
+        return len(self.records)
+
+    @property
+    def last_updated(self) -> str:
+        """ISO 8601 timestamp of the source data, as shown in JSON payloads."""
+        return self.last_modified.isoformat() if self.last_modified else "Unknown"
+
+
+def build_entry(key: CacheKey, records: List[Dict[str, Any]], pipeline: str = 'api') -> CacheEntry:
+    """Serialize, index and precompress one leaderboard version.
+
+    The steps are timed as stages of pipeline.
+    """
+    last_modified = key_last_modified(key)
+    last_updated = last_modified.isoformat() if last_modified else "Unknown"
+    with stage('serialize', pipeline):
+        body = serialize_leaderboard(records, last_updated)
+    with stage('compress', pipeline):
+        variants = compress_variants(body)
+        etags = make_etags(body, variants)
+    with stage('index', pipeline):
+        index = LeaderboardIndex(records)
+    return CacheEntry(key=key, records=records, body=body,
+                      index=index,
+                      last_modified=last_modified,
+                      variants=variants,
+                      etags=etags)
+
+
+class LeaderboardCache:
+    """Process-wide leaderboard cache keyed on the stat() of its source files.
+
+    Requests whose files are unchanged only pay for the stat() calls. When a
+    file changes, the rebuild runs on a small bounded thread pool and every
+    concurrent caller awaits the same in-flight future, so a burst of
+    refreshes never triggers duplicate rebuilds and the event loop is never
+    blocked by parsing. Async callers that already have a previous version
+    wait at most `timeout` seconds before being served that stale version
+    while the rebuild finishes in the background (stale-while-revalidate).
+    A failed rebuild also keeps the last good version.
+    """
+
+    def __init__(self, paths: Sequence[Path],
+                 loader: Callable[[], List[Dict[str, Any]]],
+                 max_workers: int = Config.RANKING_WORKERS,
+                 timeout: float = Config.RANKING_TIMEOUT_SECONDS):
+        self.paths = tuple(paths)
+        self.timeout = timeout
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._entry: Optional[CacheEntry] = None
+        self._inflight: Optional[Future] = None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="leaderboard-rebuild")
+
+    def current_key(self) -> CacheKey:
+        """Stat every source file and return the combined version key."""
+        return tuple(file_key(path) for path in self.paths)
+
+    def _fresh_entry(self) -> Optional[CacheEntry]:
+        """Return the cached entry if its key still matches the files on disk."""
+        entry = self._entry
+        if entry is not None and entry.key == self.current_key():
+            return entry
+        return None
+
+    def _rebuild(self) -> CacheEntry:
+        """Load and build a new entry; runs on the rebuild pool."""
+        try:
+            key = self.current_key()
+            logger.info("Leaderboard data changed, rebuilding cache")
+            records = self._loader()
+            # Publish the fully built entry with a single reference swap
+            entry = build_entry(key, records)
+            self._entry = entry
+            return entry
+        except Exception as e:
+            logger.error(f"Leaderboard rebuild failed: {e}")
+            raise
+        finally:
+            with self._lock:
+                self._inflight = None
+
+    def refresh(self) -> Future:
+        """Start a rebuild, or join the one already in flight."""
+        with self._lock:
+            if self._inflight is None:
+                self._inflight = self._executor.submit(self._rebuild)
+            return self._inflight
+
+    def get(self) -> CacheEntry:
+        """Return the cached entry, blocking on a rebuild if any source file changed."""
+        entry = self._fresh_entry()
+        if entry is not None:
+            CACHE_REQUESTS.labels('leaderboard', 'hit').inc()
+            return entry
+        CACHE_REQUESTS.labels('leaderboard', 'miss').inc()
+        return self.refresh().result()
+
+    async def get_async(self) -> CacheEntry:
+        """Event-loop friendly get() with stale-while-revalidate.
+
+        Raises:
+            Exception: Whatever the loader raised, if there is no previous
+                version to fall back to
+        """
+        entry = self._fresh_entry()
+        if entry is not None:
+            CACHE_REQUESTS.labels('leaderboard', 'hit').inc()
+            return entry
+
+        stale = self._entry
+        pending = asyncio.wrap_future(self.refresh())
+        if stale is None:
+            CACHE_REQUESTS.labels('leaderboard', 'miss').inc()
+            return await pending
+
+        # Retrieve the outcome even when nobody is left awaiting it
+        pending.add_done_callback(lambda done: done.cancelled() or done.exception())
+        try:
+            entry = await asyncio.wait_for(asyncio.shield(pending), self.timeout)
+            CACHE_REQUESTS.labels('leaderboard', 'miss').inc()
+            return entry
+        except asyncio.TimeoutError:
+            logger.debug(f"Leaderboard rebuild exceeded {self.timeout}s, serving previous version")
+        except Exception as e:
+            logger.debug(f"Leaderboard rebuild failed, serving previous version: {e}")
+        CACHE_REQUESTS.labels('leaderboard', 'stale').inc()
+        return stale
+
+    def invalidate(self) -> None:
+        """Drop the cached entry so the next call rebuilds it."""
+        self._entry = None
+
+    def close(self) -> None:
+        """Stop the rebuild pool, letting a running rebuild finish."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
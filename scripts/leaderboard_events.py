@@ -0,0 +1,135 @@
+"""
+Push channel for leaderboard updates.
+Watches the leaderboard data files from an asyncio task, computes a compact
+diff between consecutive versions and fans the encoded event out to every
+Server-Sent Events subscriber.
+"""
+
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from leaderboard_cache import CacheEntry, LeaderboardCache, serialize_json
+from utils import Config
+
+logger = logging.getLogger(__name__)
+
+
+def diff_leaderboards(old: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Describe which users are new or changed rank/score, and who was removed."""
+    previous = {record['Username']: record for record in old}
+    changes = []
+    for record in new:
+        before = previous.pop(record['Username'], None)
+        if before is None or before != record:
+            change = dict(record)
+            change['Previous_Rank'] = before['Rank'] if before else None
+            changes.append(change)
+    return {"changes": changes, "removed": list(previous)}
+
+
+def format_sse(event: str, data: bytes, event_id: Optional[str] = None) -> bytes:
+    """Encode one Server-Sent Events frame."""
+    frame = b""
+    if event_id:
+        frame += b"id: " + event_id.encode("utf-8") + b"\n"
+    return frame + b"event: " + event.encode("utf-8") + b"\ndata: " + data + b"\n\n"
+
+
+class LeaderboardBroadcaster:
+    """Fan out pre-encoded events to per-connection queues.
+
+    Every subscriber gets the same bytes object, so an update costs one
+    encode plus one queue put per connection. A subscriber too slow to keep
+    up has its backlog replaced with a single 'resync' event.
+    """
+
+    RESYNC = format_sse("resync", b"{}")
+
+    def __init__(self, queue_size: int = Config.SSE_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Set[asyncio.Queue] = set()
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    def publish(self, frame: bytes) -> None:
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self.RESYNC)
+
+
+def update_event(old: Optional[CacheEntry], new: CacheEntry) -> Optional[bytes]:
+    """Encode the SSE frame announcing a new leaderboard version.
+
+    Returns None when no participant's row changed, e.g. when only the raw
+    data file was touched and the published leaderboard is the same.
+    """
+    # Shared bundles carry the frame their publisher already diffed
+    published_event = getattr(new, "published_event", None)
+    if published_event is not None:
+        return published_event(old)
+
+    payload = diff_leaderboards(old.records if old else [], new.records)
+    if not payload["changes"] and not payload["removed"]:
+        return None
+    payload["version"] = new.etags["identity"]
+    payload["total_participants"] = len(new.records)
+    payload["last_updated"] = new.last_updated
+    return format_sse("leaderboard", serialize_json(payload), new.etags["identity"])
+
+
+async def watch_leaderboard(cache: LeaderboardCache, broadcaster: LeaderboardBroadcaster,
+                            interval: float = Config.WATCH_INTERVAL_SECONDS) -> None:
+    """Poll the source files' stat() and broadcast a diff whenever they change.
+
+    Only stat() runs on the event loop; rebuilding the cache entry happens on
+    the cache's rebuild pool.
+    """
+    current: Optional[CacheEntry] = None
+    while True:
+        try:
+            if current is None or cache.current_key() != current.key:
+                entry = await cache.get_async()
+                if current is not None and entry.etags != current.etags:
+                    frame = update_event(current, entry)
+                    if frame is not None:
+                        logger.info(f"Leaderboard changed, notifying {len(broadcaster)} subscribers")
+                        broadcaster.publish(frame)
+                current = entry
+        except Exception as e:
+            logger.error(f"Error watching leaderboard files: {e}")
+        await asyncio.sleep(interval)
+
+
+async def event_stream(broadcaster: LeaderboardBroadcaster, entry: CacheEntry,
+                       last_event_id: Optional[str] = None,
+                       heartbeat: float = Config.SSE_HEARTBEAT_SECONDS) -> AsyncIterator[bytes]:
+    """Yield SSE frames for one client until it disconnects."""
+    queue = broadcaster.subscribe()
+    try:
+        version = entry.etags["identity"]
+        yield b"retry: 5000\n\n"
+        if last_event_id and last_event_id != version:
+            # Missed updates while disconnected
+            yield LeaderboardBroadcaster.RESYNC
+        yield format_sse("hello", serialize_json({"version": version}), version)
+        while True:
+            try:
+                yield await asyncio.wait_for(queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+    finally:
+        broadcaster.unsubscribe(queue)
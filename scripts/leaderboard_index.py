@@ -0,0 +1,124 @@
+"""
+Precomputed lookup indexes over one leaderboard version.
+Built once when the cached leaderboard is rebuilt so that paging, sorting,
+username prefix searches and single-user lookups never scan or sort the full
+list per request.
+"""
+
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+# Columns clients may sort by; records arrive already ordered by Rank
+SORTABLE_COLUMNS = ('Rank', 'Username', 'Quizzes_Participated',
+                    'Avg_Points', 'Avg_Time', 'Final_Score')
+
+# Sorts after every other code point, closing the bisect range of a prefix
+_PREFIX_END = '\U0010ffff'
+
+
+def _sort_key(column: str):
+    """Key function for a column; usernames sort case-insensitively."""
+    if column == 'Username':
+        return lambda record: record['Username'].lower()
+    return lambda record: record[column]
+
+
+class LeaderboardIndex:
+    """Sorted position arrays per column, a sorted username array and a
+    case-insensitive username -> position hash index.
+
+    Positions refer to the records list, which is in Rank order. Ties keep
+    Rank order in both directions because Python's sort is stable, also
+    with reverse=True.
+    """
+
+    def __init__(self, records: List[Dict[str, Any]]):
+        self.records = records
+        positions = range(len(records))
+        self._orders: Dict[Tuple[str, bool], Sequence[int]] = {
+            ('Rank', False): positions,
+            ('Rank', True): positions[::-1],
+        }
+        for column in SORTABLE_COLUMNS[1:]:
+            key = _sort_key(column)
+            for descending in (False, True):
+                order = sorted(positions, key=lambda i: key(records[i]), reverse=descending)
+                self._orders[(column, descending)] = array('i', order)
+
+        by_name = self._orders[('Username', False)]
+        self.usernames = [records[i]['Username'].lower() for i in by_name]
+
+        # First (best ranked) record wins if two names differ only in case
+        self.positions: Mapping[str, int] = {}
+        for position, record in enumerate(records):
+            self.positions.setdefault(record['Username'].lower(), position)
+
+    @classmethod
+    def from_orders(cls, records: Sequence[Dict[str, Any]],
+                    orders: Dict[Tuple[str, bool], Sequence[int]],
+                    usernames: Sequence[str], positions: Mapping[str, int]) -> 'LeaderboardIndex':
+        """An index over sort orders and a hash index built elsewhere, e.g.
+        mapped from a shared bundle; nothing is sorted or hashed here.
+        """
+        index = cls.__new__(cls)
+        index.records = records
+        rank_order = range(len(records))
+        index._orders = {('Rank', False): rank_order, ('Rank', True): rank_order[::-1], **orders}
+        index.usernames = usernames
+        index.positions = positions
+        return index
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def sort_orders(self) -> Dict[Tuple[str, bool], Sequence[int]]:
+        """The record positions sorted by each column but Rank, for from_orders."""
+        return {key: order for key, order in self._orders.items() if key[0] != 'Rank'}
+
+    def lookup(self, username: str) -> Optional[int]:
+        """Return the position of a username (case-insensitive), or None."""
+        return self.positions.get(username.lower())
+
+    def percentile(self, position: int) -> float:
+        """Percentage of the other participants ranked below the given position."""
+        if len(self.records) <= 1:
+            return 100.0
+        return round((len(self.records) - 1 - position) / (len(self.records) - 1) * 100, 2)
+
+    def neighbors(self, position: int, k: int) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Return the k records ranked directly above and below a position."""
+        return self.records[max(0, position - k):position], self.records[position + 1:position + 1 + k]
+
+    def prefix_positions(self, prefix: str) -> Sequence[int]:
+        """Positions of usernames starting with prefix (case-insensitive), in name order."""
+        prefix = prefix.lower()
+        lo = bisect_left(self.usernames, prefix)
+        hi = bisect_left(self.usernames, prefix + _PREFIX_END, lo)
+        return self._orders[('Username', False)][lo:hi]
+
+    def page(self, offset: int, limit: int, sort: str = 'Rank',
+             descending: bool = False, prefix: str = '') -> Tuple[int, List[Dict[str, Any]]]:
+        """Return (total matches, records) for one page.
+
+        Without a prefix this is an O(page size) slice of a precomputed
+        order. With a prefix the matching range is found by bisection and
+        only the m matches are sorted, unless sorting by Username.
+
+        Raises:
+            ValueError: If sort is not one of SORTABLE_COLUMNS
+        """
+        if sort not in SORTABLE_COLUMNS:
+            raise ValueError(f"Cannot sort by '{sort}'")
+
+        if prefix:
+            matches = self.prefix_positions(prefix)
+            if sort == 'Username':
+                order = matches[::-1] if descending else matches
+            else:
+                key = _sort_key(sort)
+                order = sorted(sorted(matches), key=lambda i: key(self.records[i]), reverse=descending)
+        else:
+            order = self._orders[(sort, descending)]
+
+        return len(order), [self.records[i] for i in order[offset:offset + limit]]
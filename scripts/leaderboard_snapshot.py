@@ -0,0 +1,76 @@
+"""
+Typed columnar snapshot of the computed leaderboard.
+Stores the leaderboard as a single NumPy structured array (.npy) with fixed
+dtypes and a dictionary-encoded Remark column, so the API can memory-map it
+instead of re-parsing the CSV text.
+"""
+
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from utils import Config, atomic_write
+
+logger = logging.getLogger(__name__)
+
+# Column name -> dtype; Username width is sized per snapshot
+NUMERIC_DTYPES = {
+    'Rank': '<i4',
+    'Quizzes_Participated': '<i4',
+    'Avg_Points': '<f8',
+    'Avg_Time': '<f8',
+    'Final_Score': '<f8',
+}
+# Remark is stored as an index into Config.REMARKS
+REMARK_DTYPE = '<i1'
+
+
+def snapshot_dtype(username_width: int) -> np.dtype:
+    """Return the structured dtype of a snapshot with the given username width."""
+    return np.dtype([
+        ('Rank', NUMERIC_DTYPES['Rank']),
+        ('Username', f'<U{max(username_width, 1)}'),
+        ('Quizzes_Participated', NUMERIC_DTYPES['Quizzes_Participated']),
+        ('Avg_Points', NUMERIC_DTYPES['Avg_Points']),
+        ('Avg_Time', NUMERIC_DTYPES['Avg_Time']),
+        ('Final_Score', NUMERIC_DTYPES['Final_Score']),
+        ('Remark', REMARK_DTYPE),
+    ])
+
+
+def write_snapshot(final_output: "pd.DataFrame", path: Path = Config.LEADERBOARD_SNAPSHOT) -> None:
+    """Write the ranked leaderboard DataFrame as a structured .npy file.
+
+    Written through utils.atomic_write, so readers never map a partially
+    written snapshot.
+    """
+    usernames = final_output['Username'].to_numpy(dtype=str)
+    width = int(max((len(name) for name in usernames), default=1))
+
+    snapshot = np.empty(len(final_output), dtype=snapshot_dtype(width))
+    for column in NUMERIC_DTYPES:
+        snapshot[column] = final_output[column].to_numpy()
+    snapshot['Username'] = usernames
+    snapshot['Remark'] = final_output['Remark'].cat.codes.to_numpy()
+
+    with atomic_write(path, 'wb') as f:
+        np.save(f, snapshot, allow_pickle=False)
+    logger.info(f"Leaderboard snapshot saved to {path}")
+
+
+def load_snapshot(path: Path = Config.LEADERBOARD_SNAPSHOT) -> Optional[np.ndarray]:
+    """Memory-map a snapshot read-only; returns None if it does not exist."""
+    if not path.exists():
+        return None
+    return np.load(path, mmap_mode='r', allow_pickle=False)
+
+
+def snapshot_records(snapshot: np.ndarray) -> List[Dict[str, Any]]:
+    """Convert a snapshot into the list-of-dicts shape served by the API."""
+    remarks = Config.REMARKS
+    columns = {name: snapshot[name].tolist() for name in snapshot.dtype.names}
+    columns['Remark'] = [remarks[code] for code in columns['Remark']]
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*columns.values())]
@@ -1,18 +1,42 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 import os
-import re
-import pandas as pd
-import random
+import asyncio
 import logging
-from typing import List, Dict, Any
+from functools import lru_cache
+from typing import List, Dict, Any, Optional
 from pathlib import Path
+from contextlib import asynccontextmanager
+
+from data_validator import DataValidator
+from http_caching import etag_matches, http_date, not_modified_since, select_encoding
+from leaderboard_cache import CacheEntry, LeaderboardCache, build_entry, file_key, serialize_json
+from leaderboard_events import LeaderboardBroadcaster, event_stream, watch_leaderboard
+from leaderboard_index import SORTABLE_COLUMNS
+from metrics import (CACHE_REQUESTS, CONTENT_TYPE, MetricsMiddleware, RequestProfiler,
+                     render_metrics, stage)
+from quiz_history import QuizRange
+from ranking_engine import rank_leaderboard, totals_to_frame
+from shared_leaderboard import SHARED_DIR_ENV, LeaderboardPublisher, SharedLeaderboardCache
+from storage import get_repository
+from utils import Config
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run the data file watcher that feeds /leaderboard/stream."""
+    watcher = asyncio.create_task(watch_leaderboard(leaderboard_cache, broadcaster))
+    try:
+        yield
+    finally:
+        watcher.cancel()
+        leaderboard_cache.close()
 
 app = FastAPI(
     title="Arat Kilo Gibi Gubae Quiz API",
     description="API for retrieving quiz leaderboard data",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure logging
@@ -27,164 +51,192 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-DATA_FILE = Path(__file__).parent.parent / "data" / "quizRankData.txt"
-CSV_FILE = Path(__file__).parent.parent / "data" / "cumulative_leaderboard.csv"
+# Request latency histograms, plus profiles of slow requests when
+# PROFILE_SLOW_MS is set; the SSE stream stays open, so it is left out
+app.add_middleware(
+    MetricsMiddleware,
+    profiler=(RequestProfiler(Config.PROFILE_SLOW_REQUEST_MS)
+              if Config.PROFILE_SLOW_REQUEST_MS is not None else None),
+    streaming_paths=("/leaderboard/stream",),
+)
 
-def parse_time_to_seconds(time_str: str) -> float:
-    """Convert time strings like '1 min 35 sec' or '45.6 sec' to float seconds."""
-    if not time_str or not isinstance(time_str, str):
-        return 0.0
-        
-    time_str = time_str.lower().strip()
-    total_seconds = 0.0
-    
-    try:
-        # Handle 'X min Y sec'
-        min_match = re.search(r'(\d+)\s*min', time_str)
-        if min_match:
-            total_seconds += int(min_match.group(1)) * 60
-        
-        # Handle 'X.X sec' or 'X sec'
-        sec_match = re.search(r'(\d+(?:\.\d+)?)\s*sec', time_str)
-        if sec_match:
-            total_seconds += float(sec_match.group(1))
-            
-        return total_seconds
-    except (ValueError, AttributeError) as e:
-        logger.warning(f"Error parsing time string '{time_str}': {e}")
-        return 0.0
+repository = get_repository()
 
 def calculate_leaderboard() -> List[Dict[str, Any]]:
-    """Calculate cumulative leaderboard from quiz data."""
+    """Calculate cumulative leaderboard from the configured storage backend."""
     try:
-        # First try to load from CSV for better performance
-        if CSV_FILE.exists():
-            logger.info(f"Loading leaderboard from CSV: {CSV_FILE}")
-            df = pd.read_csv(CSV_FILE)
-            return df.to_dict(orient='records')
-        
-        # Fallback to processing raw data
-        if not DATA_FILE.exists():
-            logger.error(f"Data file not found: {DATA_FILE}")
-            return []
-
-        logger.info(f"Processing raw data from: {DATA_FILE}")
-        with open(DATA_FILE, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-
-        user_data = []
-        # Match various Telegram quiz result formats
-        result_pattern = re.compile(r'^\s*(?:🥇|🥈|🥉|\d+\.)\s*(@\S+|[^\u2013\n]+)\s*\u2013\s*(\d+)\s*\((.*?)\)')
-
-        for line_num, line in enumerate(lines, 1):
-            line = line.strip()
-            if not line:
-                continue
-                
-            match = result_pattern.match(line)
-            if match:
-                try:
-                    username = match.group(1).strip().replace('@', '')
-                    score = int(match.group(2))
-                    time_raw = match.group(3)
-                    time_sec = parse_time_to_seconds(time_raw)
-                    
-                    # Validate data
-                    if username and score >= 0 and time_sec >= 0:
-                        user_data.append({
-                            'Username': username,
-                            'Score': score,
-                            'Seconds': time_sec
-                        })
-                except (ValueError, AttributeError) as e:
-                    logger.warning(f"Error parsing line {line_num}: '{line}' - {e}")
-                    continue
-
-        if not user_data:
-            logger.warning("No valid quiz data found")
-            return []
-
-        df = pd.DataFrame(user_data)
-        agg_df = df.groupby('Username').agg(
-            Quizzes_Participated=('Score', 'count'),
-            Total_Score=('Score', 'sum'),
-            Total_Seconds=('Seconds', 'sum')
-        ).reset_index()
-        
-        agg_df['Avg_Points'] = agg_df['Total_Score'] / agg_df['Quizzes_Participated']
-        agg_df['Avg_Time'] = agg_df['Total_Seconds'] / agg_df['Quizzes_Participated']
-        
-        # Calculate weighted scores with safety checks
-        max_participation = agg_df['Quizzes_Participated'].max()
-        max_avg_points = agg_df['Avg_Points'].max()
-        
-        agg_df['Participation_Score'] = (agg_df['Quizzes_Participated'] / max_participation * 50) if max_participation > 0 else 0
-        agg_df['Accuracy_Score'] = (agg_df['Avg_Points'] / max_avg_points * 25) if max_avg_points > 0 else 0
-        
-        def calculate_speed_score(row):
-            if row['Avg_Time'] <= 50: 
-                return 25.0
-            return (50 / row['Avg_Time']) * 25
-
-        agg_df['Speed_Score'] = agg_df.apply(calculate_speed_score, axis=1)
-        agg_df['Final_Score'] = agg_df['Participation_Score'] + agg_df['Accuracy_Score'] + agg_df['Speed_Score']
-        
-        # Add deterministic tie-breaking
-        random.seed(42)
-        agg_df['Random_Rank'] = [random.random() for _ in range(len(agg_df))]
-        
-        agg_df = agg_df.sort_values(
-            by=['Final_Score', 'Avg_Points', 'Avg_Time', 'Quizzes_Participated', 'Random_Rank'],
-            ascending=[False, False, True, False, True]
-        )
-        
-        agg_df['Rank'] = range(1, len(agg_df) + 1)
-        
-        def get_remark(score):
-            if score >= 40: 
-                return "እግዚአብሔር ያክብራችሁ በርቱ🥰"
-            elif 20 <= score < 40: 
-                return "እንዴ በርቱ እንጂ አሁን F ላይ ናችሁ፤ በቀጣይ NG ነው የሚሆነው🤭"
-            else: 
-                return "እናንተማ እያውደለደላችሁ ነው፤ ሥራህን አውቃለሁ፤ በራድ ወይም ትኩስ እንዳልሆንህ፤ በራድ ወይም ትኩስ ብትሆንስ መልካም በሆነ ነበር። እንዲሁ ለዘብተኛ ስለሆንህ በራድም ወይም ትኩስ ስላልሆንህ ከአፌ ልተፋህ ነው። የተባለው ለናንተ ነው የሚመስለው😂"
-
-        agg_df['Remark'] = agg_df['Final_Score'].apply(get_remark)
-        
-        # Convert to dict and round numerical values
-        result = agg_df[['Rank', 'Username', 'Quizzes_Participated', 'Avg_Points', 'Avg_Time', 'Final_Score', 'Remark']].to_dict(orient='records')
-        
-        # Round numerical values for cleaner output
-        for item in result:
-            item['Avg_Points'] = round(float(item['Avg_Points']), 2)
-            item['Avg_Time'] = round(float(item['Avg_Time']), 1)
-            item['Final_Score'] = round(float(item['Final_Score']), 2)
-        
+        result = repository.load_leaderboard()
         logger.info(f"Successfully processed {len(result)} participants")
         return result
         
     except Exception as e:
+        # Let the cache keep serving the last good version
         logger.error(f"Error calculating leaderboard: {e}")
-        return []
+        raise
+
+# Process-wide cache: rebuilt only when one of the backend's source files changes.
+# Worker processes started with API_WORKERS > 1 instead map the snapshot
+# the parent process publishes, so the leaderboard is only built once.
+if os.environ.get(SHARED_DIR_ENV):
+    leaderboard_cache = SharedLeaderboardCache(Path(os.environ[SHARED_DIR_ENV]))
+else:
+    leaderboard_cache = LeaderboardCache(repository.source_paths(), calculate_leaderboard)
+broadcaster = LeaderboardBroadcaster()
+
+quiz_history = repository.history
+
+@lru_cache(maxsize=Config.WINDOW_CACHE_SIZE)
+def _window_entry(generation: int, quiz_range: QuizRange) -> CacheEntry:
+    """Rank one quiz range; cached per history generation."""
+    with stage('aggregate', pipeline='window'):
+        users = quiz_history.window_totals(quiz_range)
+    with stage('score', pipeline='window'):
+        records = rank_leaderboard(totals_to_frame(users)).to_dict(orient='records') if users else []
+    return build_entry(tuple(file_key(path) for path in quiz_history.source_paths()), records,
+                       pipeline='window')
+
+def windowed_leaderboard(window: str, since: Optional[str]) -> CacheEntry:
+    """Leaderboard over the quizzes of a time window, from per-user prefix sums.
+    
+    Raises:
+        ValueError: If the window or date is malformed
+    """
+    if not quiz_history.db_path.exists():
+        return build_entry((None,), [])
+    quiz_range = quiz_history.resolve_window(window, since)
+    if quiz_range is None:
+        return build_entry((None,), [])
+    misses = _window_entry.cache_info().misses
+    entry = _window_entry(quiz_history.generation(), quiz_range)
+    CACHE_REQUESTS.labels('window', 'miss' if _window_entry.cache_info().misses > misses else 'hit').inc()
+    return entry
+
+def full_leaderboard_response(entry: CacheEntry, request: Request) -> Response:
+    """Serve the precomputed full leaderboard, honoring conditional requests."""
+    encoding = select_encoding(request.headers.get("accept-encoding"), entry.variants)
+    headers = {
+        "ETag": entry.etags[encoding],
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if entry.last_modified:
+        headers["Last-Modified"] = http_date(entry.last_modified)
+    
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match is not None:
+        not_modified = etag_matches(if_none_match, entry.etags.values())
+    else:
+        not_modified = bool(if_modified_since and entry.last_modified
+                            and not_modified_since(if_modified_since, entry.last_modified))
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=entry.variants[encoding], media_type="application/json", headers=headers)
 
 @app.get("/leaderboard")
-async def get_leaderboard():
-    """Get the current quiz leaderboard."""
+async def get_leaderboard(
+    request: Request,
+    offset: int = Query(0, ge=0, description="Number of entries to skip"),
+    limit: Optional[int] = Query(None, ge=1, le=Config.MAX_PAGE_SIZE, description="Page size"),
+    sort: str = Query("Rank", description="Column to sort by, prefix with '-' for descending"),
+    q: Optional[str] = Query(None, description="Username prefix filter"),
+    window: Optional[str] = Query(None, description="'all', 'last_N' quizzes or a 'YYYY-MM' month"),
+    since: Optional[str] = Query(None, description="Only quizzes ingested on or after this ISO date")
+):
+    """Get the current quiz leaderboard, optionally paged, sorted and filtered.
+    
+    With window or since the leaderboard only counts the matching quizzes
+    from the history store.
+    """
     try:
-        leaderboard = calculate_leaderboard()
-        if not leaderboard:
+        if window or since:
+            try:
+                entry = await asyncio.to_thread(windowed_leaderboard, window or "all", since)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        else:
+            entry = await leaderboard_cache.get_async()
+        if not entry.participants:
             raise HTTPException(status_code=404, detail="No leaderboard data available")
-        return {
+        
+        prefix = DataValidator.sanitize_search_query(q or "").lstrip('@')
+        if offset == 0 and limit is None and sort == "Rank" and not prefix:
+            # Unfiltered request: send the pre-serialized full response
+            return full_leaderboard_response(entry, request)
+        
+        descending = sort.startswith('-')
+        column = sort.lstrip('-')
+        if column not in SORTABLE_COLUMNS:
+            raise HTTPException(status_code=400, detail=f"Invalid sort column. Choose from: {', '.join(SORTABLE_COLUMNS)}")
+        
+        page_size = limit if limit is not None else entry.participants
+        total_matches, page = entry.index.page(offset, page_size, column, descending, prefix)
+        return Response(content=serialize_json({
             "status": "success",
-            "data": leaderboard,
-            "total_participants": len(leaderboard),
-            "last_updated": "Unknown"  # TODO: Add timestamp tracking
-        }
+            "data": page,
+            "total_participants": entry.participants,
+            "total_matches": total_matches,
+            "offset": offset,
+            "limit": limit,
+            "sort": sort,
+            "last_updated": entry.last_updated
+        }), media_type="application/json")
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error in /leaderboard endpoint: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@app.get("/leaderboard/stream")
+async def stream_leaderboard(request: Request):
+    """Server-Sent Events stream of leaderboard changes.
+    
+    Sends a 'leaderboard' event with the users whose rank or score changed
+    each time the data files are updated, and 'resync' when the client
+    should refetch /leaderboard in full.
+    """
+    entry = await leaderboard_cache.get_async()
+    return StreamingResponse(
+        event_stream(broadcaster, entry, request.headers.get("last-event-id")),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/users/{username}")
+async def get_user(
+    username: str,
+    k: int = Query(2, ge=0, le=Config.MAX_NEIGHBORS, description="Entries to include above and below")
+):
+    """Get one participant's standing with percentile and neighboring entries."""
+    try:
+        entry = await leaderboard_cache.get_async()
+        position = entry.index.lookup(username.strip().lstrip('@'))
+        if position is None:
+            raise HTTPException(status_code=404, detail="Participant not found")
+        
+        above, below = entry.index.neighbors(position, k)
+        return Response(content=serialize_json({
+            "status": "success",
+            "data": entry.records[position],
+            "percentile": entry.index.percentile(position),
+            "above": above,
+            "below": below,
+            "total_participants": entry.participants
+        }), media_type="application/json")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in /users endpoint: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@app.get("/metrics")
+async def get_metrics():
+    """Stage timings, request latency and cache counters in Prometheus text format."""
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
+
 @app.get("/")
 async def root():
     """Root endpoint with API information."""
@@ -192,16 +244,24 @@ async def root():
         "message": "Arat Kilo Gibi Gubae Quiz API",
         "version": "1.0.0",
         "endpoints": {
-            "/leaderboard": "Get quiz leaderboard data",
+            "/leaderboard": "Get quiz leaderboard data (supports offset, limit, sort, q, window and since)",
+            "/leaderboard/stream": "Server-Sent Events stream of leaderboard changes",
+            "/users/{username}": "Get a participant's rank, percentile and neighbors",
+            "/metrics": "Prometheus metrics",
             "/docs": "API documentation (Swagger UI)"
         }
     }
 
 @app.exception_handler(404)
 async def not_found_handler(request, exc):
+    # Keep the detail an endpoint gave, e.g. for an unknown participant;
+    # unmatched routes carry Starlette's default "Not Found"
+    detail = getattr(exc, "detail", None)
+    if not detail or detail == "Not Found":
+        detail = "Endpoint not found"
     return JSONResponse(
         status_code=404,
-        content={"detail": "Endpoint not found"}
+        content={"detail": detail}
     )
 
 @app.exception_handler(500)
@@ -213,4 +273,12 @@ async def internal_error_handler(request, exc):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    if Config.API_WORKERS > 1:
+        publisher = LeaderboardPublisher(leaderboard_cache)
+        publisher.start()
+        os.environ[SHARED_DIR_ENV] = str(publisher.directory)
+        uvicorn.run("main:app", host=Config.API_HOST, port=Config.API_PORT,
+                    workers=Config.API_WORKERS, app_dir=str(Path(__file__).parent))
+        publisher.stop()
+    else:
+        uvicorn.run(app, host=Config.API_HOST, port=Config.API_PORT)
@@ -0,0 +1,346 @@
+"""
+Metrics for the Arat Kilo Gibi Gubae Quiz System.
+Dependency-free counters and histograms rendered in the Prometheus text
+format at /metrics: per-stage timings of the API and generator pipelines,
+request latency and cache hits. Each API worker process keeps its own
+counts. generate_rankings runs as a separate batch job, so it writes the
+stage timings of its last run to Config.GENERATOR_METRICS_FILE, which
+/metrics appends. An opt-in profiler keeps profiles of slow requests.
+"""
+
+import io
+import time
+import pstats
+import cProfile
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from utils import Config, atomic_write
+
+try:
+    from pyinstrument import Profiler
+except ImportError:  # Optional: cProfile statistics are written without it
+    Profiler = None
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; request and stage latencies range from sub-millisecond cache hits
+# to multi-second rebuilds of large leaderboards
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Registry:
+    """A set of metrics rendered together."""
+
+    def __init__(self):
+        self.metrics: List['Metric'] = []
+
+    def render(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        return ''.join(metric.render() for metric in self.metrics)
+
+
+REGISTRY = Registry()
+
+
+class Metric:
+    """Base of the metric types: a named family of labelled series."""
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Registry = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        registry.metrics.append(self)
+
+    def _new_series(self) -> Any:
+        raise NotImplementedError
+
+    def labels(self, *values: Any) -> Any:
+        """The series for one combination of label values, created on first use."""
+        key = tuple(str(value) for value in values)
+        series = self._series.get(key)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(key, self._new_series())
+        return series
+
+    def _samples(self, key: Tuple[str, ...], series: Any) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}\n", f"# TYPE {self.name} {self.kind}\n"]
+        for key, series in sorted(self._series.items()):
+            lines.extend(self._samples(key, series))
+        return ''.join(lines)
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(Metric):
+    """A monotonically increasing count."""
+
+    kind = 'counter'
+
+    def _new_series(self) -> _Value:
+        return _Value()
+
+    def _samples(self, key: Tuple[str, ...], series: _Value) -> Iterator[str]:
+        yield f"{self.name}{_labels(self.labelnames, key)} {_number(series.value)}\n"
+
+
+class Gauge(Counter):
+    """A value that is set rather than counted."""
+
+    kind = 'gauge'
+
+
+class _Buckets:
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.counts[bisect_left(self.bounds, value)] += 1
+            self.sum += value
+
+
+class Histogram(Metric):
+    """Counts of observations in cumulative buckets, plus their sum and count."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Registry = REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_series(self) -> _Buckets:
+        return _Buckets(self.buckets)
+
+    def _samples(self, key: Tuple[str, ...], series: _Buckets) -> Iterator[str]:
+        with series._lock:
+            counts = list(series.counts)
+            total = series.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else _number(bound)
+            labels = _labels(self.labelnames, key, f'le="{le}"')
+            yield f"{self.name}_bucket{labels} {cumulative}\n"
+        yield f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}\n"
+        yield f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}\n"
+
+
+STAGE_SECONDS = Histogram(
+    'akgg_stage_duration_seconds', 'Time spent in each stage of the leaderboard pipeline.',
+    ('pipeline', 'stage'))
+REQUEST_SECONDS = Histogram(
+    'akgg_http_request_duration_seconds', 'HTTP request latency until the response starts.',
+    ('method', 'route', 'status'))
+CACHE_REQUESTS = Counter(
+    'akgg_cache_requests_total', 'Leaderboard cache lookups by cache and result.',
+    ('cache', 'result'))
+
+
+@contextmanager
+def stage(name: str, pipeline: str = 'api',
+          timings: Optional[Dict[str, float]] = None) -> Iterator[None]:
+    """Time a pipeline stage into STAGE_SECONDS, and add it to timings if given."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(pipeline, name).observe(elapsed)
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+
+def write_generator_metrics(timings: Dict[str, float], participants: int,
+                            path: Path = Config.GENERATOR_METRICS_FILE) -> None:
+    """Save the stage timings of a successful generate_rankings run for /metrics."""
+    registry = Registry()
+    stage_seconds = Gauge('akgg_generator_stage_seconds',
+                          'Duration of each stage in the last generate_rankings run.',
+                          ('stage',), registry=registry)
+    for name, seconds in timings.items():
+        stage_seconds.labels(name).set(round(seconds, 6))
+    Gauge('akgg_generator_participants', 'Participants ranked by the last generate_rankings run.',
+          registry=registry).labels().set(participants)
+    Gauge('akgg_generator_last_success_timestamp_seconds',
+          'Unix time of the last successful generate_rankings run.',
+          registry=registry).labels().set(round(time.time(), 3))
+    with atomic_write(path) as f:
+        f.write(registry.render())
+
+
+def render_metrics() -> str:
+    """This process's metrics followed by those of the last generator run."""
+    text = REGISTRY.render()
+    try:
+        text += Config.GENERATOR_METRICS_FILE.read_text(encoding='utf-8')
+    except FileNotFoundError:
+        pass
+    return text
+
+
+class RequestProfiler:
+    """Profile one request at a time and keep the profile if it was slow.
+
+    Uses pyinstrument when installed (an HTML report) and cProfile otherwise
+    (pstats text). Only the event loop thread is profiled, and requests
+    running concurrently with the profiled one show up in its profile.
+    """
+
+    def __init__(self, threshold_ms: float, directory: Path = Config.PROFILE_DIR):
+        self.threshold = threshold_ms / 1000
+        self.directory = Path(directory)
+        self._active = False
+
+    def start(self) -> Optional[Any]:
+        """Start profiling, unless another request is being profiled."""
+        if self._active:
+            return None
+        self._active = True
+        if Profiler is not None:
+            profiler = Profiler(async_mode='enabled')
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        return profiler
+
+    def cancel(self, profiler: Any) -> None:
+        """Stop profiling without keeping the profile."""
+        try:
+            if Profiler is not None:
+                profiler.stop()
+            else:
+                profiler.disable()
+        finally:
+            self._active = False
+
+    def stop(self, profiler: Any, elapsed: float, label: str) -> Optional[Path]:
+        """Stop profiling and write the profile if the request was slow."""
+        try:
+            if Profiler is not None:
+                profiler.stop()
+            else:
+                profiler.disable()
+            if elapsed < self.threshold:
+                return None
+
+            stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+            name = ''.join(c if c.isalnum() else '_' for c in label).strip('_')[:60]
+            if Profiler is not None:
+                path = self.directory / f"{stamp}-{name}.html"
+                report = profiler.output_html()
+            else:
+                path = self.directory / f"{stamp}-{name}.txt"
+                out = io.StringIO()
+                pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(50)
+                report = f"{label}: {elapsed * 1000:.1f} ms\n\n{out.getvalue()}"
+            with atomic_write(path) as f:
+                f.write(report)
+            logger.warning(f"Slow request {label} took {elapsed * 1000:.1f} ms, profile saved to {path}")
+            return path
+        except Exception as e:
+            logger.error(f"Failed to save request profile: {e}")
+            return None
+        finally:
+            self._active = False
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency, and profiling when enabled.
+
+    Long-lived streams, such as Server-Sent Events, stay open for as long as
+    a client listens, so they are neither timed nor profiled: requests to
+    streaming_paths are passed straight through, and any other response
+    sent as text/event-stream is dropped from the histogram and releases
+    the profiler as soon as its headers go out.
+    """
+
+    def __init__(self, app: Any, profiler: Optional[RequestProfiler] = None,
+                 streaming_paths: Sequence[str] = ()):
+        self.app = app
+        self.profiler = profiler
+        self.streaming_paths = frozenset(streaming_paths)
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope['type'] != 'http' or scope['path'] in self.streaming_paths:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started: Optional[float] = None
+        streaming = False
+        profile = None
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            nonlocal status, started, streaming, profile
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                started = time.perf_counter()
+                streaming = any(name.lower() == b'content-type' and value.startswith(b'text/event-stream')
+                                for name, value in message.get('headers', ()))
+                if streaming and profile is not None:
+                    self.profiler.cancel(profile)
+                    profile = None
+            await send(message)
+
+        profile = self.profiler.start() if self.profiler else None
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Other streaming responses count until their headers are sent
+            elapsed = (started or time.perf_counter()) - start
+            route = scope.get('route')
+            if not streaming:
+                REQUEST_SECONDS.labels(scope['method'], getattr(route, 'path', 'unmatched'),
+                                       status).observe(elapsed)
+            if profile is not None:
+                self.profiler.stop(profile, elapsed, f"{scope['method']} {scope['path']}")
@@ -0,0 +1,372 @@
+"""
+Per-quiz result history for the Arat Kilo Gibi Gubae Quiz System.
+Stores every parsed result with its quiz in SQLite, together with per-user
+prefix sums over quizzes in ingest order. Any contiguous range of quizzes
+(the last N, one month, everything since a date) is then answered as the
+difference of two prefix rows per user instead of re-scanning the results.
+The database runs in WAL mode, so readers keep a consistent snapshot while
+an ingest commits.
+"""
+
+import re
+import sqlite3
+import logging
+from contextlib import closing
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from quiz_parser import QuizResult, block_fingerprint
+from utils import Config
+
+logger = logging.getLogger(__name__)
+
+# Usernames or fingerprints bound per IN (...) query, below SQLite's
+# parameter limit
+USERNAME_BATCH = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS quizzes (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    quiz_index INTEGER NOT NULL,
+    ingested_at TEXT NOT NULL,
+    -- block_fingerprint of the quiz's results, to spot the same quiz in
+    -- another export
+    fingerprint TEXT,
+    UNIQUE (source, quiz_index)
+);
+CREATE INDEX IF NOT EXISTS quizzes_ingested_at ON quizzes (ingested_at);
+CREATE TABLE IF NOT EXISTS results (
+    quiz_id INTEGER NOT NULL REFERENCES quizzes (id),
+    username TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    -- From an unterminated last line; replaced by the next ingest
+    pending INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS results_quiz ON results (quiz_id);
+CREATE INDEX IF NOT EXISTS results_username ON results (username, quiz_id);
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY
+) WITHOUT ROWID;
+-- Running totals of a user up to and including quiz_id, one row per quiz
+-- the user took part in
+CREATE TABLE IF NOT EXISTS user_prefix (
+    username TEXT NOT NULL,
+    quiz_id INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    total_score INTEGER NOT NULL,
+    total_seconds REAL NOT NULL,
+    PRIMARY KEY (username, quiz_id)
+) WITHOUT ROWID;
+-- All-time totals per user, kept in step with results by every ingest
+CREATE TABLE IF NOT EXISTS user_totals (
+    username TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    total_score INTEGER NOT NULL,
+    total_seconds REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Each user's last prefix row at or before a bound is one index probe on
+# the (username, quiz_id) primary key
+LATEST_PREFIX = """
+SELECT u.username,
+       (SELECT MAX(quiz_id) FROM user_prefix p
+        WHERE p.username = u.username AND p.quiz_id <= :end) AS end_id,
+       (SELECT MAX(quiz_id) FROM user_prefix p
+        WHERE p.username = u.username AND p.quiz_id < :start) AS start_id
+FROM users u
+"""
+
+# Totals between two bounds: the difference of the two prefix rows
+WINDOW_QUERY = f"""
+WITH bounds AS MATERIALIZED ({LATEST_PREFIX})
+SELECT b.username,
+       e.count - COALESCE(s.count, 0),
+       e.total_score - COALESCE(s.total_score, 0),
+       e.total_seconds - COALESCE(s.total_seconds, 0.0)
+FROM bounds b
+JOIN user_prefix e ON e.username = b.username AND e.quiz_id = b.end_id
+LEFT JOIN user_prefix s ON s.username = b.username AND s.quiz_id = b.start_id
+WHERE e.count > COALESCE(s.count, 0)
+"""
+
+LAST_N_WINDOW = re.compile(r'^last_(\d+)$')
+MONTH_WINDOW = re.compile(r'^\d{4}-\d{2}$')
+
+# Inclusive range of quiz ids
+QuizRange = Tuple[int, int]
+
+
+class QuizHistory:
+    """SQLite store of quizzes, results and per-user prefix sums.
+
+    Quiz ids grow in ingest order, so every time window is a contiguous id
+    range. Quizzes are dated by when they were first ingested because the
+    exports carry no dates.
+    """
+
+    def __init__(self, db_path: Path = Config.HISTORY_DB):
+        self.db_path = Path(db_path)
+        self._schema_ready = False
+
+    def connect(self) -> sqlite3.Connection:
+        """Open a connection with the schema in place."""
+        if not self._schema_ready:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=Config.DB_BUSY_TIMEOUT_SECONDS)
+        # WAL commits are durable at checkpoints; a crash can only lose the
+        # last transactions, never corrupt the store
+        conn.execute("PRAGMA synchronous = NORMAL")
+        if not self._schema_ready:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.executescript(SCHEMA)
+            with conn:
+                self._add_fingerprints(conn)
+            self._schema_ready = True
+        return conn
+
+    @staticmethod
+    def _add_fingerprints(conn: sqlite3.Connection) -> None:
+        """Add the quizzes' fingerprint column to a store created without it."""
+        if 'fingerprint' not in {row[1] for row in conn.execute("PRAGMA table_info(quizzes)")}:
+            conn.execute("ALTER TABLE quizzes ADD COLUMN fingerprint TEXT")
+            # Results are inserted in file order, so rowid order rebuilds each block
+            blocks: Dict[int, List[QuizResult]] = {}
+            for quiz_id, rank, username, score, seconds in conn.execute(
+                    "SELECT quiz_id, rank, username, score, seconds FROM results ORDER BY quiz_id, rowid"):
+                blocks.setdefault(quiz_id, []).append(QuizResult(0, rank, username, score, seconds))
+            conn.executemany("UPDATE quizzes SET fingerprint = ? WHERE id = ?",
+                             [(block_fingerprint(results), quiz_id) for quiz_id, results in blocks.items()])
+        conn.execute("CREATE INDEX IF NOT EXISTS quizzes_fingerprint ON quizzes (fingerprint)")
+
+    def source_paths(self) -> List[Path]:
+        """Files whose stat() changes on every commit: the database and its WAL."""
+        return [self.db_path, self.db_path.with_name(self.db_path.name + "-wal")]
+
+    def generation(self) -> int:
+        """Counter bumped by every ingest, for cache keys."""
+        if not self.db_path.exists():
+            return 0
+        with closing(self.connect()) as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        return row[0] if row else 0
+
+    def ingest(self, source: str, results: Iterable[QuizResult], reset: bool = False,
+               pending: Iterable[QuizResult] = ()) -> int:
+        """Store the results of one export file in a single transaction.
+
+        Args:
+            source: Resolved path of the export the results came from
+            results: Newly parsed results, quiz_index numbered per file
+            reset: The file was re-parsed from the start, so replace the
+                results stored for it instead of appending
+            pending: Results of an unterminated last line; they are counted
+                until the next ingest of the file, which parses that line again
+
+        Returns:
+            int: Number of results stored
+        """
+        now = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        with closing(self.connect()) as conn, conn:
+            quiz_ids = dict(conn.execute(
+                "SELECT quiz_index, id FROM quizzes WHERE source = ?", (source,)))
+            first_changed: Optional[int] = None
+            affected = set()
+            replaced_ids = set()
+            if quiz_ids:
+                # On reset quiz ids and dates are kept; only the results are replaced
+                replaced = "quiz_id IN (SELECT id FROM quizzes WHERE source = ?)"
+                if not reset:
+                    replaced += " AND pending = 1"
+                for quiz_id, username in conn.execute(
+                        f"SELECT DISTINCT quiz_id, username FROM results WHERE {replaced}", (source,)):
+                    replaced_ids.add(quiz_id)
+                    affected.add(username)
+                first_changed = min(replaced_ids, default=None)
+                conn.execute(f"DELETE FROM results WHERE {replaced}", (source,))
+
+            seen = set()
+            rows = []
+            blocks: Dict[int, List[QuizResult]] = {}
+            for is_pending, batch in ((0, results), (1, pending)):
+                for result in batch:
+                    quiz_id = quiz_ids.get(result.quiz_index)
+                    if quiz_id is None:
+                        quiz_id = conn.execute(
+                            "INSERT INTO quizzes (source, quiz_index, ingested_at) VALUES (?, ?, ?)",
+                            (source, result.quiz_index, now)).lastrowid
+                        quiz_ids[result.quiz_index] = quiz_id
+                    seen.add(quiz_id)
+                    blocks.setdefault(quiz_id, []).append(result)
+                    if first_changed is None or quiz_id < first_changed:
+                        first_changed = quiz_id
+                    rows.append((quiz_id, result.username, result.rank, result.score,
+                                 result.seconds, is_pending))
+
+            conn.executemany("INSERT INTO results VALUES (?, ?, ?, ?, ?, ?)", rows)
+            conn.executemany("UPDATE quizzes SET fingerprint = ? WHERE id = ?",
+                             [(block_fingerprint(results), quiz_id) for quiz_id, results in blocks.items()])
+            conn.executemany("INSERT OR IGNORE INTO users VALUES (?)",
+                             {(row[1],) for row in rows})
+            # Replaced quizzes left without results: gone after a reset, or a
+            # pending block that turned out to be a duplicate
+            conn.executemany("DELETE FROM quizzes WHERE id = ? AND NOT EXISTS "
+                             "(SELECT 1 FROM results WHERE quiz_id = ?)",
+                             [(quiz_id, quiz_id) for quiz_id in replaced_ids - seen])
+
+            if first_changed is not None:
+                affected.update(row[1] for row in rows)
+                totals = self._rebuild_prefix(conn, first_changed, affected)
+                conn.executemany("INSERT OR REPLACE INTO user_totals VALUES (?, ?, ?, ?)",
+                                 [(name, *totals[name]) for name in affected if name in totals])
+                conn.executemany("DELETE FROM user_totals WHERE username = ?",
+                                 [(name,) for name in affected if name not in totals])
+                conn.execute("INSERT INTO meta VALUES ('generation', 1) "
+                             "ON CONFLICT (key) DO UPDATE SET value = value + 1")
+        return len(rows)
+
+    @staticmethod
+    def _rebuild_prefix(conn: sqlite3.Connection, from_id: int,
+                        usernames: Iterable[str]) -> Dict[str, List[float]]:
+        """Recompute the prefix rows of the given users from quiz from_id onwards.
+
+        Only users with a replaced or new result can have changed prefix
+        rows, so after an append this touches the new quizzes' participants,
+        and after a pending block is replaced only that block's participants,
+        however many quizzes other files added since.
+
+        Returns:
+            The all-time totals of those users that still have a result
+        """
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS affected_users (username TEXT PRIMARY KEY) WITHOUT ROWID")
+        conn.execute("DELETE FROM affected_users")
+        conn.executemany("INSERT INTO affected_users VALUES (?)", ((name,) for name in usernames))
+        conn.execute("DELETE FROM user_prefix WHERE quiz_id >= ? AND username IN "
+                     "(SELECT username FROM affected_users)", (from_id,))
+
+        # CROSS JOIN keeps the few affected users as the outer loop
+        totals: Dict[str, List[float]] = {}
+        for username, count, score, seconds in conn.execute(
+                "SELECT p.username, p.count, p.total_score, p.total_seconds FROM affected_users a "
+                "CROSS JOIN user_prefix p ON p.username = a.username AND p.quiz_id = "
+                "(SELECT MAX(quiz_id) FROM user_prefix q WHERE q.username = a.username AND q.quiz_id < ?)",
+                (from_id,)):
+            totals[username] = [count, score, seconds]
+
+        rows = []
+        for quiz_id, username, count, score, seconds in conn.execute(
+                "SELECT r.quiz_id, r.username, COUNT(*), SUM(r.score), SUM(r.seconds) "
+                "FROM affected_users a CROSS JOIN results r ON r.username = a.username AND r.quiz_id >= ? "
+                "GROUP BY r.quiz_id, r.username ORDER BY r.quiz_id", (from_id,)):
+            running = totals.setdefault(username, [0, 0, 0.0])
+            running[0] += count
+            running[1] += score
+            running[2] += seconds
+            rows.append((username, quiz_id, *running))
+        conn.executemany("INSERT INTO user_prefix VALUES (?, ?, ?, ?, ?)", rows)
+        return totals
+
+    def user_totals(self, usernames: Optional[Iterable[str]] = None) -> Dict[str, List[float]]:
+        """All-time [count, total_score, total_seconds] per user, or of these users only."""
+        if not self.db_path.exists():
+            return {}
+        query = "SELECT username, count, total_score, total_seconds FROM user_totals"
+        with closing(self.connect()) as conn:
+            if usernames is None:
+                rows = conn.execute(query).fetchall()
+            else:
+                names = list(usernames)
+                rows = []
+                for start in range(0, len(names), USERNAME_BATCH):
+                    batch = names[start:start + USERNAME_BATCH]
+                    rows += conn.execute(f"{query} WHERE username IN ({', '.join('?' * len(batch))})",
+                                         batch).fetchall()
+        return {username: [count, score, seconds] for username, count, score, seconds in rows}
+
+    def block_sources(self, fingerprints: Iterable[str], exclude_source: Optional[str] = None) -> Dict[str, str]:
+        """The source already holding each of these quiz block fingerprints, if any.
+
+        Args:
+            fingerprints: block_fingerprint values to look up
+            exclude_source: Source whose own quizzes are not counted
+        """
+        if not self.db_path.exists():
+            return {}
+        fingerprints = list(set(fingerprints))
+        sources: Dict[str, str] = {}
+        with closing(self.connect()) as conn:
+            for start in range(0, len(fingerprints), USERNAME_BATCH):
+                batch = fingerprints[start:start + USERNAME_BATCH]
+                for fingerprint, source in conn.execute(
+                        f"SELECT fingerprint, source FROM quizzes WHERE fingerprint IN "
+                        f"({', '.join('?' * len(batch))}) AND source IS NOT ? ORDER BY id DESC",
+                        (*batch, exclude_source)):
+                    # The earliest ingested holder wins
+                    sources[fingerprint] = source
+        return sources
+
+    def source_fingerprints(self, source: str) -> Set[str]:
+        """Fingerprints of the quiz blocks stored for one export."""
+        if not self.db_path.exists():
+            return set()
+        with closing(self.connect()) as conn:
+            return {fingerprint for (fingerprint,) in conn.execute(
+                "SELECT fingerprint FROM quizzes WHERE source = ?", (source,))}
+
+    def resolve_window(self, window: str = 'all', since: Optional[str] = None) -> Optional[QuizRange]:
+        """Translate a window name or start date into a quiz id range.
+
+        Args:
+            window: 'all', 'last_N' for the N most recent quizzes, or
+                'YYYY-MM' for the quizzes ingested in that month
+            since: ISO date or datetime; only quizzes ingested from then on
+
+        Returns:
+            The inclusive (first, last) quiz id range, or None if no quiz
+            falls in the window
+
+        Raises:
+            ValueError: If the window or date cannot be parsed
+        """
+        with closing(self.connect()) as conn:
+            if since:
+                start = datetime.fromisoformat(since)
+                if start.tzinfo is None:
+                    start = start.replace(tzinfo=timezone.utc)
+                bounds = conn.execute(
+                    "SELECT MIN(id), MAX(id) FROM quizzes WHERE ingested_at >= ?",
+                    (start.astimezone(timezone.utc).isoformat(timespec='seconds'),)).fetchone()
+            elif window == 'all':
+                bounds = conn.execute("SELECT MIN(id), MAX(id) FROM quizzes").fetchone()
+            elif LAST_N_WINDOW.match(window):
+                count = int(LAST_N_WINDOW.match(window).group(1))
+                if count < 1:
+                    raise ValueError("last_N needs N >= 1")
+                bounds = conn.execute(
+                    "SELECT MIN(id), MAX(id) FROM (SELECT id FROM quizzes ORDER BY id DESC LIMIT ?)",
+                    (count,)).fetchone()
+            elif MONTH_WINDOW.match(window):
+                bounds = conn.execute(
+                    "SELECT MIN(id), MAX(id) FROM quizzes WHERE substr(ingested_at, 1, 7) = ?",
+                    (window,)).fetchone()
+            else:
+                raise ValueError(f"Unknown window '{window}'")
+        return None if bounds[0] is None else (bounds[0], bounds[1])
+
+    def window_totals(self, quiz_range: QuizRange) -> Dict[str, List[float]]:
+        """Per-user [count, total_score, total_seconds] over a quiz id range."""
+        start, end = quiz_range
+        with closing(self.connect()) as conn:
+            return {
+                username: [count, score, seconds]
+                for username, count, score, seconds
+                in conn.execute(WINDOW_QUERY, {'start': start, 'end': end})
+            }
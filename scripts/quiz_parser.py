@@ -0,0 +1,147 @@
+"""
+Streaming parser for Telegram quiz result exports.
+Yields one compact record per result line without reading the whole export
+into memory, numbering quizzes by the 🥇 line that opens each result block.
+Blocks pasted twice are recognised by a fingerprint of their results.
+"""
+
+import re
+import hashlib
+import logging
+from pathlib import Path
+from typing import Iterable, Iterator, List, NamedTuple, Union
+
+from time_parser import parse_time_to_seconds
+
+logger = logging.getLogger(__name__)
+
+# Regex for results line: 🥇 @user – 5 (30.3 sec) or  4. @user – 5 (35.5 sec)
+# Note: Using \u2013 for the dash (–)
+RESULT_PATTERN = re.compile(
+    r'^\s*(?:(?P<medal>🥇|🥈|🥉)|(?P<rank>\d+)\.)\s*(?P<username>@\S+|[^\u2013\n]+)'
+    r'\s*\u2013\s*(?P<score>\d+)\s*\((?P<time>.*?)\)'
+)
+
+GOLD_MARKER = '🥇'
+MEDAL_RANKS = {'🥇': 1, '🥈': 2, '🥉': 3}
+
+LineSource = Union[str, Path, Iterable[str]]
+
+
+class QuizResult(NamedTuple):
+    """A single participant's result in one quiz."""
+    quiz_index: int
+    rank: int
+    username: str
+    score: int
+    seconds: float
+
+
+class QuizBlock(NamedTuple):
+    """The results of one quiz, as opened by a 🥇 line."""
+    quiz_index: int
+    line: int
+    results: List[QuizResult]
+
+
+def is_block_start(line: str) -> bool:
+    """True for the 🥇 result line that opens a new quiz block."""
+    if GOLD_MARKER not in line:
+        return False
+    match = RESULT_PATTERN.match(line.strip())
+    return bool(match) and match.group('medal') == GOLD_MARKER
+
+
+def block_fingerprint(results: Iterable[QuizResult]) -> str:
+    """SHA-256 of a block's parsed results, independent of its position.
+
+    Blank and metadata lines do not contribute, so a block pasted again
+    with different spacing still has the same fingerprint.
+    """
+    digest = hashlib.sha256()
+    for result in results:
+        digest.update(f"{result.rank}\t{result.username}\t{result.score}\t{result.seconds!r}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def iter_lines(source: LineSource) -> Iterator[str]:
+    """Lazily yield lines from a file path or any iterable of strings."""
+    if isinstance(source, (str, Path)):
+        with open(source, 'r', encoding='utf-8') as f:
+            yield from f
+    else:
+        yield from source
+
+
+class QuizExportParser:
+    """Stateful line parser that can resume where a previous run stopped.
+
+    Attributes:
+        quiz_index: Index of the quiz block currently being read (-1 before
+            the first block)
+        line_num: Number of lines consumed so far
+    """
+
+    def __init__(self, quiz_index: int = -1, line_num: int = 0):
+        self.quiz_index = quiz_index
+        self.line_num = line_num
+
+    def parse(self, lines: Iterable[str]) -> Iterator[QuizResult]:
+        """Yield a QuizResult for every valid result line."""
+        for line in lines:
+            self.line_num += 1
+            line = line.strip()
+            if not line:
+                continue
+
+            match = RESULT_PATTERN.match(line)
+            if not match:
+                continue
+
+            medal = match.group('medal')
+            if medal == GOLD_MARKER or self.quiz_index < 0:
+                self.quiz_index += 1
+
+            try:
+                username = match.group('username').strip().replace('@', '')
+                score = int(match.group('score'))
+                time_sec = parse_time_to_seconds(match.group('time'))
+                rank = MEDAL_RANKS[medal] if medal else int(match.group('rank'))
+            except (ValueError, AttributeError) as e:
+                logger.warning(f"Error parsing line {self.line_num}: '{line}' - {e}")
+                continue
+
+            # Validate data
+            if username and score >= 0 and time_sec >= 0:
+                yield QuizResult(self.quiz_index, rank, username, score, time_sec)
+            else:
+                logger.warning(f"Invalid data on line {self.line_num}: {line}")
+
+    def parse_blocks(self, lines: Iterable[str]) -> Iterator[QuizBlock]:
+        """Group the parsed results into one QuizBlock per quiz."""
+        block = None
+        for result in self.parse(lines):
+            if block is None or result.quiz_index != block.quiz_index:
+                if block is not None:
+                    yield block
+                block = QuizBlock(result.quiz_index, self.line_num, [])
+            block.results.append(result)
+        if block is not None:
+            yield block
+
+
+def iter_results(source: LineSource) -> Iterator[QuizResult]:
+    """Stream QuizResult records from a file path or an iterable of lines."""
+    return QuizExportParser().parse(iter_lines(source))
+
+
+def iter_unique_results(source: LineSource) -> Iterator[QuizResult]:
+    """Like iter_results, but skip quiz blocks identical to an earlier block."""
+    seen = set()
+    for block in QuizExportParser().parse_blocks(iter_lines(source)):
+        fingerprint = block_fingerprint(block.results)
+        if fingerprint in seen:
+            logger.info(f"Skipping duplicate quiz block at line {block.line}")
+            continue
+        seen.add(fingerprint)
+        yield from block.results
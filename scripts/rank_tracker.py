@@ -0,0 +1,365 @@
+"""
+Incremental rank maintenance for live score updates.
+Keeps every user's position in the weighted leaderboard order in an
+order-statistic list, so that folding in one quiz's results re-ranks only the
+users who took part instead of re-scoring and re-sorting everyone. Ranks,
+scores and tie-breakers match ranking_engine.rank_leaderboard.
+"""
+
+import logging
+from bisect import bisect_left, insort
+from itertools import chain, islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ranking_engine import OUTPUT_COLUMNS, REMARKS, remark_codes, score_columns, tie_break
+from utils import Config
+
+logger = logging.getLogger(__name__)
+
+# Keys per bucket of a SortedKeyList; buckets split at twice this size
+BUCKET_LOAD = 512
+
+# Sorts after every username, closing the key range of a fully tied group
+_PREFIX_END = '\U0010ffff'
+
+# (-Final_Score, -Avg_Points, Avg_Time, -Quizzes_Participated, Username)
+RankKey = Tuple[float, float, float, float, str]
+
+
+class SortedKeyList:
+    """Sorted multiset with O(log n) insertion, removal and rank queries.
+
+    Keys live in sorted buckets of at most 2 * BUCKET_LOAD keys. A Fenwick
+    tree over the bucket sizes turns a position within a bucket into a
+    position in the whole list, and back.
+    """
+
+    def __init__(self, keys: Iterable[Any] = (), load: int = BUCKET_LOAD):
+        self._load = load
+        keys = sorted(keys)
+        self._buckets: List[List[Any]] = [keys[i:i + load] for i in range(0, len(keys), load)]
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        self._len = len(keys)
+        self._build_tree()
+
+    def _build_tree(self) -> None:
+        tree = [0] + [len(bucket) for bucket in self._buckets]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _tree_add(self, bucket: int, delta: int) -> None:
+        i = bucket + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _keys_before(self, bucket: int) -> int:
+        """Number of keys in the buckets before this one."""
+        total = 0
+        i = bucket
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _locate(self, index: int) -> Tuple[int, int]:
+        """The bucket holding position index, and the offset within it."""
+        bucket = 0
+        step = 1 << (len(self._tree).bit_length() - 1)
+        while step:
+            following = bucket + step
+            if following < len(self._tree) and self._tree[following] <= index:
+                bucket = following
+                index -= self._tree[following]
+            step >>= 1
+        return bucket, index
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[Any]:
+        return chain.from_iterable(self._buckets)
+
+    def __getitem__(self, index: int) -> Any:
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("SortedKeyList index out of range")
+        bucket, offset = self._locate(index)
+        return self._buckets[bucket][offset]
+
+    def add(self, key: Any) -> None:
+        """Insert a key."""
+        if not self._buckets:
+            self._buckets.append([key])
+            self._maxes.append(key)
+            self._len = 1
+            self._build_tree()
+            return
+        b = min(bisect_left(self._maxes, key), len(self._buckets) - 1)
+        bucket = self._buckets[b]
+        insort(bucket, key)
+        self._maxes[b] = bucket[-1]
+        self._len += 1
+        if len(bucket) > 2 * self._load:
+            self._buckets[b:b + 1] = [bucket[:self._load], bucket[self._load:]]
+            self._maxes[b:b + 1] = [bucket[self._load - 1], bucket[-1]]
+            self._build_tree()
+        else:
+            self._tree_add(b, 1)
+
+    def remove(self, key: Any) -> None:
+        """Remove one occurrence of a key.
+
+        Raises:
+            ValueError: If the key is not in the list
+        """
+        b = bisect_left(self._maxes, key)
+        bucket = self._buckets[b] if b < len(self._buckets) else []
+        i = bisect_left(bucket, key)
+        if i == len(bucket) or bucket[i] != key:
+            raise ValueError(f"{key!r} not in list")
+        del bucket[i]
+        self._len -= 1
+        if bucket:
+            self._maxes[b] = bucket[-1]
+            self._tree_add(b, -1)
+        else:
+            del self._buckets[b]
+            del self._maxes[b]
+            self._build_tree()
+
+    def bisect_left(self, key: Any) -> int:
+        """Number of keys smaller than key."""
+        b = bisect_left(self._maxes, key)
+        if b == len(self._buckets):
+            return self._len
+        return self._keys_before(b) + bisect_left(self._buckets[b], key)
+
+    def islice(self, start: int, stop: int) -> Iterator[Any]:
+        """The keys at positions [start, stop)."""
+        start, stop = max(start, 0), min(stop, self._len)
+        if start >= stop:
+            return iter(())
+        bucket, offset = self._locate(start)
+        keys = chain(islice(self._buckets[bucket], offset, None),
+                     chain.from_iterable(self._buckets[bucket + 1:]))
+        return islice(keys, stop - start)
+
+
+class RankTracker:
+    """Every user's rank, kept current under per-user total updates.
+
+    Users are held by their rank key in a SortedKeyList, so update() and
+    rank() take O(log n). Final_Score is normalized by the largest quiz
+    count and average points: while an update leaves both unchanged only
+    the updated users are re-keyed, otherwise every key is recomputed (a
+    renormalization, counted in renormalizations).
+
+    Users tied on every score column are ordered by rank_leaderboard's
+    random tie-breaker, which is drawn in username order; it is looked up
+    only for such ties.
+    """
+
+    def __init__(self, users: Optional[Dict[str, Sequence[float]]] = None):
+        self._totals: Dict[str, List[float]] = {
+            username: list(totals) for username, totals in (users or {}).items() if totals[0] > 0}
+        self._usernames = SortedKeyList(self._totals)
+        self._counts = SortedKeyList(totals[0] for totals in self._totals.values())
+        self._avg_points = SortedKeyList(totals[1] / totals[0] for totals in self._totals.values())
+        self._keys: Dict[str, RankKey] = {}
+        self._order = SortedKeyList()
+        self._normalizers = self._current_normalizers()
+        self._tie_breaks: Optional[np.ndarray] = None
+        self.renormalizations = 0
+        self._renormalize()
+
+    def __len__(self) -> int:
+        return len(self._totals)
+
+    def __contains__(self, username: str) -> bool:
+        return username in self._totals
+
+    def _current_normalizers(self) -> Tuple[float, float]:
+        """Largest quiz count and average points."""
+        if not self._totals:
+            return 0, 0.0
+        return self._counts[-1], self._avg_points[-1]
+
+    def _key(self, username: str, totals: Sequence[float]) -> RankKey:
+        """Rank key with the arithmetic of ranking_engine.score_columns."""
+        count, total_score, total_seconds = totals
+        avg_points = total_score / count
+        avg_time = total_seconds / count
+        max_participation, max_avg_points = self._normalizers
+        participation = (count / max_participation) * Config.PARTICIPATION_WEIGHT if max_participation > 0 else 0.0
+        accuracy = (avg_points / max_avg_points) * Config.ACCURACY_WEIGHT if max_avg_points > 0 else 0.0
+        threshold = Config.SPEED_THRESHOLD_SECONDS
+        speed = (float(Config.SPEED_WEIGHT) if avg_time <= threshold
+                 else (threshold / avg_time) * Config.SPEED_WEIGHT)
+        return (-(participation + accuracy + speed), -avg_points, avg_time, -count, username)
+
+    def _renormalize(self) -> None:
+        """Recompute every key, vectorized, and rebuild the order."""
+        usernames = list(self._totals)
+        totals = np.fromiter(chain.from_iterable(self._totals.values()), dtype=np.float64,
+                             count=3 * len(usernames)).reshape(-1, 3)
+        count = totals[:, 0]
+        avg_points, avg_time, final_score = score_columns(count, totals[:, 1], totals[:, 2])
+        order = np.lexsort((-count, avg_time, -avg_points, -final_score))
+        keys = zip((-final_score[order]).tolist(), (-avg_points[order]).tolist(),
+                   avg_time[order].tolist(), (-count[order]).tolist(),
+                   [usernames[i] for i in order])
+        self._keys = {key[4]: key for key in keys}
+        self._order = SortedKeyList(self._keys.values())
+        self.renormalizations += 1
+
+    def _apply(self, changed: Dict[str, List[float]], removed: Iterable[str] = ()) -> int:
+        """Store new totals of some users and re-rank them."""
+        removed = set(removed) | {username for username, totals in changed.items() if totals[0] <= 0}
+        changed = {username: totals for username, totals in changed.items() if username not in removed}
+        removed &= self._totals.keys()
+        for username in chain(removed, changed):
+            old = self._totals.get(username)
+            if old is not None:
+                self._counts.remove(old[0])
+                self._avg_points.remove(old[1] / old[0])
+            elif username in changed:
+                self._usernames.add(username)
+        for username in removed:
+            del self._totals[username]
+            self._usernames.remove(username)
+        for username, totals in changed.items():
+            self._totals[username] = totals
+            self._counts.add(totals[0])
+            self._avg_points.add(totals[1] / totals[0])
+        if removed or any(username not in self._keys for username in changed):
+            # New or departed users shift the username order of the tie-breakers
+            self._tie_breaks = None
+
+        normalizers = self._current_normalizers()
+        if normalizers != self._normalizers:
+            self._normalizers = normalizers
+            self._renormalize()
+        else:
+            for username in chain(removed, changed):
+                old_key = self._keys.pop(username, None)
+                if old_key is not None:
+                    self._order.remove(old_key)
+            for username, totals in changed.items():
+                key = self._key(username, totals)
+                self._keys[username] = key
+                self._order.add(key)
+        return len(changed) + len(removed)
+
+    def update(self, username: str, delta: Sequence[float]) -> None:
+        """Add [count, score, seconds] of new results to one user's totals."""
+        self.merge({username: delta})
+
+    def merge(self, partial: Dict[str, Sequence[float]]) -> int:
+        """Add the per-user sums of new results, e.g. of one quiz, like merge_totals.
+
+        Returns:
+            int: Number of users re-ranked
+        """
+        changed = {}
+        for username, (count, score, seconds) in partial.items():
+            totals = self._totals.get(username)
+            changed[username] = ([count, score, seconds] if totals is None
+                                 else [totals[0] + count, totals[1] + score, totals[2] + seconds])
+        return self._apply(changed)
+
+    def assign(self, users: Dict[str, Optional[Sequence[float]]]) -> int:
+        """Set the totals of some users, re-ranking only them; None removes a user.
+
+        Returns:
+            int: Number of users re-ranked
+        """
+        return self._apply({username: list(totals) for username, totals in users.items() if totals is not None},
+                           [username for username, totals in users.items() if totals is None])
+
+    def sync(self, users: Dict[str, Sequence[float]]) -> int:
+        """Make the tracked totals equal users, re-ranking only those that differ.
+
+        Returns:
+            int: Number of users re-ranked
+        """
+        changed = {username: list(totals) for username, totals in users.items()
+                   if self._totals.get(username) != list(totals)}
+        return self._apply(changed, [username for username in self._totals if username not in users])
+
+    def _tie_break_values(self) -> np.ndarray:
+        """rank_leaderboard's tie-breakers, indexed by username order."""
+        if self._tie_breaks is None:
+            self._tie_breaks = tie_break(len(self._totals))
+        return self._tie_breaks
+
+    def _tie_break(self, username: str) -> float:
+        return self._tie_break_values()[self._usernames.bisect_left(username)]
+
+    def _tie_breaks_of(self, usernames: List[str]) -> np.ndarray:
+        """Tie-breakers of many users; past a few, one pass over the username order beats bisecting."""
+        if len(usernames) * 16 < len(self._totals):
+            return np.array([self._tie_break(username) for username in usernames])
+        positions = {username: i for i, username in enumerate(self._usernames)}
+        return self._tie_break_values()[[positions[username] for username in usernames]]
+
+    def _tied_range(self, key: RankKey) -> Tuple[int, int]:
+        """Positions in the order of the users tied with key on every score column."""
+        return (self._order.bisect_left(key[:4]),
+                self._order.bisect_left(key[:4] + (_PREFIX_END,)))
+
+    def rank(self, username: str) -> Optional[int]:
+        """A user's Rank; None if the user has no results."""
+        key = self._keys.get(username)
+        if key is None:
+            return None
+        start, stop = self._tied_range(key)
+        rank = start + 1
+        if stop - start > 1:
+            mine = self._tie_break(username)
+            rank += sum(1 for other in self._order.islice(start, stop)
+                        if self._tie_break(other[4]) < mine)
+        return rank
+
+    def records(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """The first limit leaderboard records (all by default), as rank_leaderboard lists them."""
+        limit = len(self._order) if limit is None else min(limit, len(self._order))
+        if limit <= 0:
+            return []
+        # Take the whole tied group at the cut, so it can be put in tie-break order
+        stop = self._tied_range(self._order[limit - 1])[1]
+        keys = list(self._order.islice(0, stop))
+        columns = [np.array([key[i] for key in keys], dtype=np.float64) for i in range(4)]
+
+        same = np.logical_and.reduce([column[1:] == column[:-1] for column in columns])
+        if same.any():
+            tied = np.zeros(len(keys), dtype=bool)
+            tied[1:] |= same
+            tied[:-1] |= same
+            ties = np.zeros(len(keys))
+            ties[tied] = self._tie_breaks_of([keys[i][4] for i in np.flatnonzero(tied)])
+            groups = np.concatenate(([0], np.cumsum(~same)))
+            order = np.lexsort((ties, groups))
+            keys = [keys[i] for i in order]
+            columns = [column[order] for column in columns]
+        keys = keys[:limit]
+        neg_final, neg_points, avg_time, _ = (column[:limit] for column in columns)
+
+        final_score = -neg_final
+        usernames = [key[4] for key in keys]
+        rows = zip(
+            range(1, limit + 1),
+            usernames,
+            [self._totals[username][0] for username in usernames],
+            (-neg_points).round(2).tolist(),
+            avg_time.round(1).tolist(),
+            final_score.round(2).tolist(),
+            [REMARKS[code] for code in remark_codes(final_score)],
+        )
+        return [dict(zip(OUTPUT_COLUMNS, row)) for row in rows]
@@ -0,0 +1,249 @@
+"""
+Shared ranking engine for the Arat Kilo Gibi Gubae Quiz System.
+Aggregates parsed quiz results per user and applies the weighted
+Participation/Accuracy/Speed scoring used by both the API and the batch
+leaderboard generator. pandas is only imported once a leaderboard is
+ranked, so serving a precomputed one never loads it.
+"""
+
+import logging
+from itertools import chain
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from utils import Config
+from quiz_parser import QuizResult
+
+logger = logging.getLogger(__name__)
+
+# Remarks ordered from the lowest to the highest Final_Score band
+REMARKS = Config.REMARKS
+
+OUTPUT_COLUMNS = ['Rank', 'Username', 'Quizzes_Participated', 'Avg_Points', 'Avg_Time', 'Final_Score', 'Remark']
+
+# Fully tied users up to which tie-breakers are found by counting usernames
+# instead of sorting them all
+TIE_COUNT_LIMIT = 64
+
+
+def fold_results(results: Iterable[QuizResult], users: Dict[str, List[float]]) -> int:
+    """Fold a stream of quiz results into per-user running sums.
+
+    Args:
+        results: QuizResult records, typically from quiz_parser.iter_results
+        users: Mapping of username to [count, total_score, total_seconds],
+            updated in place
+
+    Returns:
+        int: Number of results folded in
+    """
+    entries = 0
+    for result in results:
+        totals = users.get(result.username)
+        if totals is None:
+            users[result.username] = [1, result.score, result.seconds]
+        else:
+            totals[0] += 1
+            totals[1] += result.score
+            totals[2] += result.seconds
+        entries += 1
+    return entries
+
+
+def merge_totals(partial: Dict[str, List[float]], users: Dict[str, List[float]]) -> None:
+    """Add one partial aggregate (e.g. of a single export file) into users in place."""
+    for username, (count, score, seconds) in partial.items():
+        totals = users.get(username)
+        if totals is None:
+            users[username] = [count, score, seconds]
+        else:
+            totals[0] += count
+            totals[1] += score
+            totals[2] += seconds
+
+
+def totals_to_frame(users: Dict[str, List[float]]) -> "pd.DataFrame":
+    """Build the per-user totals DataFrame, ordered by username like a groupby."""
+    import pandas as pd
+
+    agg_df = pd.DataFrame.from_dict(
+        users, orient='index',
+        columns=['Quizzes_Participated', 'Total_Score', 'Total_Seconds']
+    )
+    return agg_df.sort_index().rename_axis('Username').reset_index()
+
+
+def speed_scores(avg_time: np.ndarray) -> np.ndarray:
+    """Full speed points at or under the threshold, otherwise scaled by threshold / time."""
+    threshold = Config.SPEED_THRESHOLD_SECONDS
+    weight = Config.SPEED_WEIGHT
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(avg_time <= threshold, float(weight), (threshold / avg_time) * weight)
+
+
+def remark_codes(final_score: np.ndarray) -> np.ndarray:
+    """Return the index into REMARKS of each Final_Score band."""
+    return np.select(
+        [final_score >= Config.REMARK_HIGH_THRESHOLD, final_score >= Config.REMARK_MID_THRESHOLD],
+        [2, 1],
+        default=0
+    ).astype(np.int8)
+
+
+def tie_break(n: int, seed: int = Config.TIE_BREAK_SEED) -> np.ndarray:
+    """Deterministic random tie-breaker values for n users."""
+    return np.random.default_rng(seed).random(n)
+
+
+def score_columns(count: np.ndarray, total_score: np.ndarray,
+                  total_seconds: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Average points, average time and Final_Score per user.
+
+    The normalization maxima are taken in one pass over the counts and
+    averages, so any subset of users can then be ranked without sorting.
+    """
+    avg_points = total_score / count
+    avg_time = total_seconds / count
+
+    # Normalization factors with safety checks for zero values
+    max_participation = count.max() if len(count) else 0
+    max_avg_points = avg_points.max() if len(avg_points) else 0
+
+    # Weighted Scoring (50/25/25 by default)
+    participation = (count / max_participation) * Config.PARTICIPATION_WEIGHT if max_participation > 0 else 0.0
+    accuracy = (avg_points / max_avg_points) * Config.ACCURACY_WEIGHT if max_avg_points > 0 else 0.0
+    final_score = participation + accuracy + speed_scores(avg_time)
+    return avg_points, avg_time, final_score
+
+
+def rank_leaderboard(agg_df: "pd.DataFrame") -> "pd.DataFrame":
+    """Score, rank and annotate per-user totals.
+
+    Args:
+        agg_df: DataFrame with Username, Quizzes_Participated, Total_Score and
+            Total_Seconds columns, one row per user
+
+    Returns:
+        pd.DataFrame: Leaderboard in OUTPUT_COLUMNS order, sorted by Rank
+    """
+    import pandas as pd
+
+    count = agg_df['Quizzes_Participated'].to_numpy(dtype=np.float64)
+    avg_points, avg_time, final_score = score_columns(
+        count,
+        agg_df['Total_Score'].to_numpy(dtype=np.float64),
+        agg_df['Total_Seconds'].to_numpy(dtype=np.float64),
+    )
+
+    # Sort by Final_Score (DESC), then Tie-breakers:
+    # 1. Accuracy (Avg_Points) DESC
+    # 2. Speed (Avg_Time) ASC
+    # 3. Participation DESC
+    # 4. Random
+    order = np.lexsort((tie_break(len(count)), -count, avg_time, -avg_points, -final_score))
+
+    final_output = pd.DataFrame({
+        'Rank': np.arange(1, len(order) + 1),
+        'Username': agg_df['Username'].to_numpy()[order],
+        'Quizzes_Participated': agg_df['Quizzes_Participated'].to_numpy()[order],
+        'Avg_Points': avg_points[order].round(2),
+        'Avg_Time': avg_time[order].round(1),
+        'Final_Score': final_score[order].round(2),
+        'Remark': pd.Categorical.from_codes(remark_codes(final_score[order]), categories=REMARKS),
+    })
+    return final_output
+
+
+class UserScores:
+    """Scores of every user, for a podium or single ranks without a full sort.
+
+    Ranks and tie-breakers are the ones rank_leaderboard assigns, but top(k)
+    only orders the users that can reach the first k places, and rank_of
+    counts the users ahead instead of sorting, so announcing results stays
+    cheap with hundreds of thousands of participants.
+    """
+
+    def __init__(self, users: Dict[str, List[float]]):
+        self.usernames = np.fromiter(users.keys(), dtype=object, count=len(users))
+        totals = np.fromiter(chain.from_iterable(users.values()), dtype=np.float64,
+                             count=3 * len(users)).reshape(-1, 3)
+        self.count = totals[:, 0]
+        self.avg_points, self.avg_time, self.final_score = score_columns(
+            self.count, totals[:, 1], totals[:, 2])
+
+    def __len__(self) -> int:
+        return len(self.usernames)
+
+    def _tie_breaks(self, positions: np.ndarray) -> np.ndarray:
+        """The tie_break values rank_leaderboard gives these users.
+
+        rank_leaderboard draws them in username order, so each user's value
+        is picked by the number of usernames sorting before theirs.
+        """
+        if len(positions) <= TIE_COUNT_LIMIT:
+            before = np.array([np.count_nonzero(self.usernames < self.usernames[i]) for i in positions],
+                              dtype=np.int64)
+        else:
+            order = np.empty(len(self), dtype=np.int64)
+            order[np.argsort(self.usernames, kind='stable')] = np.arange(len(self))
+            before = order[positions]
+        return tie_break(len(self))[before]
+
+    def _order(self, positions: np.ndarray) -> np.ndarray:
+        """Sort positions into Rank order, drawing tie-breakers only for full ties."""
+        keys = [-self.count[positions], self.avg_time[positions],
+                -self.avg_points[positions], -self.final_score[positions]]
+        order = np.lexsort(keys)
+        positions = positions[order]
+        keys = [key[order] for key in keys]
+        same = np.logical_and.reduce([key[1:] == key[:-1] for key in keys])
+        if not same.any():
+            return positions
+        tied = np.zeros(len(positions), dtype=bool)
+        tied[1:] |= same
+        tied[:-1] |= same
+        ties = np.zeros(len(positions))
+        ties[tied] = self._tie_breaks(positions[tied])
+        return positions[np.lexsort([ties] + keys)]
+
+    def top(self, k: int) -> List[Dict[str, Any]]:
+        """The first k leaderboard records, as rank_leaderboard would list them."""
+        k = min(k, len(self))
+        if k <= 0:
+            return []
+        # Everyone scoring at least the k-th best Final_Score can make the top k
+        kth_score = -np.partition(-self.final_score, k - 1)[k - 1]
+        candidates = np.flatnonzero(self.final_score >= kth_score)
+        top = self._order(candidates)[:k]
+
+        final_score = self.final_score[top]
+        columns = {
+            'Rank': range(1, k + 1),
+            'Username': self.usernames[top].tolist(),
+            'Quizzes_Participated': self.count[top].astype(np.int64).tolist(),
+            'Avg_Points': self.avg_points[top].round(2).tolist(),
+            'Avg_Time': self.avg_time[top].round(1).tolist(),
+            'Final_Score': final_score.round(2).tolist(),
+            'Remark': [REMARKS[code] for code in remark_codes(final_score)],
+        }
+        return [dict(zip(OUTPUT_COLUMNS, row)) for row in zip(*(columns[name] for name in OUTPUT_COLUMNS))]
+
+    def rank_of(self, username: str) -> Optional[int]:
+        """A user's Rank, found by counting the users ahead; None if unknown."""
+        matches = np.flatnonzero(self.usernames == username)
+        if not len(matches):
+            return None
+        i = matches[0]
+        # Compare key by key in rank_leaderboard's order
+        ahead = self.final_score > self.final_score[i]
+        tied = self.final_score == self.final_score[i]
+        for key in (self.avg_points, -self.avg_time, self.count):
+            ahead |= tied & (key > key[i])
+            tied &= key == key[i]
+        tied = np.flatnonzero(tied)
+        rank = 1 + int(np.count_nonzero(ahead))
+        if len(tied) > 1:
+            ties = self._tie_breaks(tied)
+            rank += int(np.count_nonzero(ties < ties[tied == i][0]))
+        return rank
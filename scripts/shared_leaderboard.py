@@ -0,0 +1,421 @@
+"""
+Shared leaderboard snapshot for multi-worker deployments.
+One builder process serializes each leaderboard version once into a bundle
+file and publishes it by bumping a generation counter in a small mmap'd
+file. Every API worker memory-maps the current bundle, so N workers share a
+single copy of the response bytes, the per-record JSON and the lookup
+index through the page cache instead of each parsing and holding its own.
+
+Run the builder next to gunicorn/uvicorn workers with:
+    python scripts/shared_leaderboard.py
+"""
+
+import json
+import mmap
+import zlib
+import struct
+import logging
+import threading
+from array import array
+from collections.abc import Mapping, Sequence
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from leaderboard_cache import CacheEntry, CacheKey, LeaderboardCache, serialize_json
+from leaderboard_events import LeaderboardBroadcaster, update_event
+from leaderboard_index import LeaderboardIndex
+from metrics import CACHE_REQUESTS
+from utils import Config, atomic_write
+
+logger = logging.getLogger(__name__)
+
+# Set in the environment of worker processes that should read the bundle
+SHARED_DIR_ENV = "AKGG_SHARED_SNAPSHOT_DIR"
+
+BUNDLE_MAGIC = b"AKGGLB02"
+HEADER_LENGTH = struct.Struct("<I")
+GENERATION = struct.Struct("<Q")
+GENERATION_FILE = "generation"
+# Array types of the record/username offsets and of the sort orders and
+# username hash slots
+OFFSET_TYPE = "Q"
+ORDER_TYPE = "i"
+SECTION_ALIGNMENT = 8
+# Marks an unused username hash slot
+EMPTY_SLOT = -1
+
+
+def bundle_path(directory: Path, generation: int) -> Path:
+    return directory / f"leaderboard-{generation}.bin"
+
+
+def _pack_strings(items: Iterable[bytes]) -> Tuple[bytes, bytes]:
+    """Concatenate encoded strings, with their n + 1 start offsets."""
+    offsets = array(OFFSET_TYPE, [0])
+    chunks = []
+    for item in items:
+        chunks.append(item)
+        offsets.append(offsets[-1] + len(item))
+    return b"".join(chunks), offsets.tobytes()
+
+
+def _name_hash(name: str) -> int:
+    # Stable across processes, unlike hash() with per-process salts
+    return zlib.crc32(name.encode("utf-8"))
+
+
+def _name_slots(usernames: Sequence[str]) -> bytes:
+    """Open-addressing hash table over sorted lowercase usernames.
+
+    Each slot holds the index of a name in usernames, or EMPTY_SLOT. Of
+    names that differ only in case, the first is kept, which is the best
+    ranked one. The table is at most half full, so probes stay short.
+    """
+    size = 1 << max(1, (2 * len(usernames) - 1).bit_length())
+    mask = size - 1
+    slots = array(ORDER_TYPE, [EMPTY_SLOT]) * size
+    previous = None
+    for i, name in enumerate(usernames):
+        if name == previous:
+            continue
+        previous = name
+        slot = _name_hash(name) & mask
+        while slots[slot] != EMPTY_SLOT:
+            slot = (slot + 1) & mask
+        slots[slot] = i
+    return slots.tobytes()
+
+
+def index_sections(entry) -> Dict[str, bytes]:
+    """Encode an entry's records, one JSON object each, and its LeaderboardIndex."""
+    sections: Dict[str, bytes] = {}
+    sections["records"], sections["record_offsets"] = _pack_strings(
+        serialize_json(record) for record in entry.records)
+    sections["usernames"], sections["username_offsets"] = _pack_strings(
+        name.encode("utf-8") for name in entry.index.usernames)
+    sections["username_slots"] = _name_slots(entry.index.usernames)
+    for (column, descending), order in entry.index.sort_orders().items():
+        sections[f"order:{column}:{int(descending)}"] = array(ORDER_TYPE, order).tobytes()
+    return sections
+
+
+def write_bundle(path: Path, generation: int, entry, event: Optional[bytes] = None,
+                 event_base: Optional[int] = None) -> None:
+    """Write one cache entry's encoded bodies, records, index and metadata to a bundle file.
+
+    Layout: magic, header length, JSON header, then the sections back to
+    back, each starting on an 8-byte boundary. Section offsets in the
+    header are relative to the end of the header. event is the SSE frame
+    announcing this version to clients of generation event_base.
+    """
+    bodies = dict(entry.variants)
+    index = index_sections(entry)
+    index["event"] = event or b""
+
+    sections: Dict[str, List[int]] = {}
+    index_offsets: Dict[str, List[int]] = {}
+    chunks = []
+    position = 0
+    for names, parts in ((sections, bodies), (index_offsets, index)):
+        for name, data in parts.items():
+            padding = -position % SECTION_ALIGNMENT
+            chunks.append(b"\0" * padding)
+            position += padding
+            names[name] = [position, len(data)]
+            chunks.append(data)
+            position += len(data)
+
+    header = json.dumps({
+        "generation": generation,
+        "last_modified": entry.last_modified.isoformat() if entry.last_modified else None,
+        "etags": entry.etags,
+        "participants": len(entry.records),
+        "sections": sections,
+        "index": index_offsets,
+        "event_base": event_base,
+    }).encode("utf-8")
+    # Trailing spaces are valid JSON and align the first section
+    header += b" " * (-(len(BUNDLE_MAGIC) + HEADER_LENGTH.size + len(header)) % SECTION_ALIGNMENT)
+
+    # Readers only ever see complete bundles
+    with atomic_write(path, "wb") as f:
+        f.write(BUNDLE_MAGIC)
+        f.write(HEADER_LENGTH.pack(len(header)))
+        f.write(header)
+        f.writelines(chunks)
+
+
+class GenerationCounter:
+    """An 8-byte generation number in a file mapped by every process."""
+
+    def __init__(self, directory: Path, create: bool = False):
+        path = directory / GENERATION_FILE
+        if create and not path.exists():
+            directory.mkdir(parents=True, exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(GENERATION.pack(0))
+        self._file = open(path, "r+b")
+        self._map = mmap.mmap(self._file.fileno(), GENERATION.size)
+
+    def read(self) -> int:
+        return GENERATION.unpack_from(self._map, 0)[0]
+
+    def publish(self, generation: int) -> None:
+        # A single aligned 8-byte store: readers see the old or the new value
+        GENERATION.pack_into(self._map, 0, generation)
+        self._map.flush()
+
+
+class _Sections(Mapping):
+    """Read-only {name: memoryview} view over the sections of a mapped bundle.
+
+    Sections are served as slices of the mapping, without copying.
+    """
+
+    def __init__(self, buffer: memoryview, base: int, sections: Dict[str, List[int]]):
+        self._buffer = buffer
+        self._base = base
+        self._sections = sections
+
+    def __getitem__(self, name: str) -> memoryview:
+        start, length = self._sections[name]
+        start += self._base
+        return self._buffer[start:start + length]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._sections)
+
+    def __len__(self) -> int:
+        return len(self._sections)
+
+
+class _PackedStrings(Sequence):
+    """Read-only sequence over strings packed by _pack_strings, decoded on access."""
+
+    def __init__(self, data: memoryview, offsets: memoryview):
+        self._data = data
+        self._offsets = offsets.cast(OFFSET_TYPE)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def _decode(self, raw: memoryview) -> Any:
+        return str(raw, "utf-8")
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("index out of range")
+        return self._decode(self._data[self._offsets[i]:self._offsets[i + 1]])
+
+
+class _PackedRecords(_PackedStrings):
+    """Leaderboard records stored one JSON object each, parsed on access."""
+
+    def _decode(self, raw: memoryview) -> Dict[str, Any]:
+        return json.loads(str(raw, "utf-8"))
+
+
+class _NamePositions(Mapping):
+    """Read-only {lowercase username: position} over the hash slots of _name_slots.
+
+    A lookup hashes the name once and decodes only the probed usernames.
+    """
+
+    def __init__(self, slots: memoryview, usernames: _PackedStrings, by_name: Sequence[int]):
+        self._slots = slots.cast(ORDER_TYPE)
+        self._mask = len(self._slots) - 1
+        self._usernames = usernames
+        self._by_name = by_name
+
+    def __getitem__(self, name: str) -> int:
+        slot = _name_hash(name) & self._mask
+        while True:
+            i = self._slots[slot]
+            if i == EMPTY_SLOT:
+                raise KeyError(name)
+            if self._usernames[i] == name:
+                return self._by_name[i]
+            slot = (slot + 1) & self._mask
+
+    def __iter__(self) -> Iterator[str]:
+        return (self._usernames[i] for i in self._slots if i != EMPTY_SLOT)
+
+    def __len__(self) -> int:
+        return sum(1 for i in self._slots if i != EMPTY_SLOT)
+
+
+class SharedCacheEntry:
+    """A CacheEntry look-alike backed by a memory-mapped bundle.
+
+    The encoded bodies are sliced straight out of the shared mapping, and
+    the index built by the publisher is read from it as well, including the
+    username hash table: paging and user lookups only parse the records they
+    return, so no worker parses or indexes the whole leaderboard.
+    """
+
+    def __init__(self, generation: int, buffer: mmap.mmap):
+        if buffer[:len(BUNDLE_MAGIC)] != BUNDLE_MAGIC:
+            raise ValueError(f"Not a leaderboard bundle (generation {generation})")
+        start = len(BUNDLE_MAGIC)
+        (header_length,) = HEADER_LENGTH.unpack_from(buffer, start)
+        start += HEADER_LENGTH.size
+        header = json.loads(buffer[start:start + header_length])
+
+        self.key: CacheKey = (generation,)
+        self.participants: int = header["participants"]
+        self.etags: Dict[str, str] = header["etags"]
+        self.last_modified: Optional[datetime] = (
+            datetime.fromisoformat(header["last_modified"]) if header["last_modified"] else None
+        )
+        view = memoryview(buffer)
+        self.variants = _Sections(view, start + header_length, header["sections"])
+        self._index = _Sections(view, start + header_length, header["index"])
+        self._event_base: Optional[int] = header["event_base"]
+
+        self.records = _PackedRecords(self._index["records"], self._index["record_offsets"])
+        orders = {}
+        for name in self._index:
+            if name.startswith("order:"):
+                _, column, descending = name.split(":")
+                orders[(column, descending == "1")] = self._index[name].cast(ORDER_TYPE)
+        usernames = _PackedStrings(self._index["usernames"], self._index["username_offsets"])
+        positions = _NamePositions(self._index["username_slots"], usernames,
+                                   orders[("Username", False)])
+        self.index = LeaderboardIndex.from_orders(self.records, orders, usernames, positions)
+
+    @property
+    def body(self) -> memoryview:
+        return self.variants["identity"]
+
+    @property
+    def last_updated(self) -> str:
+        return self.last_modified.isoformat() if self.last_modified else "Unknown"
+
+    def published_event(self, old: Optional[Any]) -> Optional[bytes]:
+        """The publisher's SSE frame for this version; a resync for clients that skipped one."""
+        if old is None or old.key != (self._event_base,):
+            return LeaderboardBroadcaster.RESYNC
+        event = self._index["event"]
+        return bytes(event) if len(event) else None
+
+
+class SharedLeaderboardCache:
+    """Worker-side drop-in for LeaderboardCache that follows the builder.
+
+    Checking for a new version is a read of the mapped generation counter;
+    switching versions maps the new bundle file, with no parsing.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._counter = GenerationCounter(self.directory)
+        self._entry: Optional[SharedCacheEntry] = None
+        self._lock = threading.Lock()
+
+    def current_key(self) -> CacheKey:
+        return (self._counter.read(),)
+
+    def get(self) -> SharedCacheEntry:
+        generation = self._counter.read()
+        entry = self._entry
+        if entry is not None and entry.key == (generation,):
+            CACHE_REQUESTS.labels('leaderboard', 'hit').inc()
+            return entry
+        if generation == 0:
+            raise RuntimeError("No leaderboard has been published yet")
+
+        CACHE_REQUESTS.labels('leaderboard', 'miss').inc()
+        with self._lock:
+            if self._entry is None or self._entry.key != (generation,):
+                with open(bundle_path(self.directory, generation), "rb") as f:
+                    buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                # Older mappings stay valid until responses using them finish
+                self._entry = SharedCacheEntry(generation, buffer)
+            return self._entry
+
+    async def get_async(self) -> SharedCacheEntry:
+        return self.get()
+
+    def close(self) -> None:
+        pass
+
+
+class LeaderboardPublisher:
+    """Builder side: rebuild on file changes and publish numbered bundles."""
+
+    def __init__(self, cache: LeaderboardCache, directory: Path = Config.SHARED_SNAPSHOT_DIR,
+                 interval: float = Config.WATCH_INTERVAL_SECONDS,
+                 keep: int = Config.SHARED_SNAPSHOT_KEEP):
+        self.cache = cache
+        self.directory = Path(directory)
+        self.interval = interval
+        self.keep = keep
+        self._counter = GenerationCounter(self.directory, create=True)
+        self._published: Optional[CacheEntry] = None
+        self._stop = threading.Event()
+
+    def publish_if_changed(self) -> bool:
+        """Publish a new generation if the source files changed.
+
+        The SSE update against the previous generation is diffed here once,
+        instead of in every worker.
+        """
+        previous = self._published
+        if previous is not None and self.cache.current_key() == previous.key:
+            return False
+
+        entry = self.cache.get()
+        generation = self._counter.read() + 1
+        if previous is None:
+            write_bundle(bundle_path(self.directory, generation), generation, entry)
+        else:
+            event = update_event(previous, entry) if entry.etags != previous.etags else None
+            write_bundle(bundle_path(self.directory, generation), generation, entry,
+                         event=event, event_base=generation - 1)
+        self._counter.publish(generation)
+        self._published = entry
+        logger.info(f"Published leaderboard generation {generation} ({len(entry.records)} participants)")
+
+        # Workers that still map an old bundle keep reading it after unlink
+        stale = bundle_path(self.directory, generation - self.keep)
+        if stale.exists():
+            stale.unlink()
+        return True
+
+    def run(self) -> None:
+        """Poll for changes until stop() is called."""
+        while not self._stop.is_set():
+            try:
+                self.publish_if_changed()
+            except Exception as e:
+                logger.error(f"Error publishing leaderboard: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self) -> threading.Thread:
+        """Publish the first generation, then keep publishing from a daemon thread."""
+        self.publish_if_changed()
+        thread = threading.Thread(target=self.run, name="leaderboard-publisher", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+if __name__ == "__main__":
+    from main import calculate_leaderboard, repository
+
+    publisher = LeaderboardPublisher(
+        LeaderboardCache(repository.source_paths(), calculate_leaderboard)
+    )
+    logger.info(f"Publishing leaderboard bundles to {publisher.directory}")
+    publisher.publish_if_changed()
+    try:
+        publisher.run()
+    except KeyboardInterrupt:
+        publisher.stop()
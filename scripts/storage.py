@@ -0,0 +1,195 @@
+"""
+Storage backends for the Arat Kilo Gibi Gubae Quiz System.
+A small repository interface over where quiz results and the cumulative
+leaderboard live, so the API, the ranking generator and the validator do not
+read data files directly. Select the backend with Config.STORAGE_BACKEND.
+"""
+
+import csv
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from leaderboard_snapshot import load_snapshot, snapshot_records
+from metrics import stage
+from quiz_history import QuizHistory
+from quiz_parser import QuizResult, iter_unique_results
+from rank_tracker import RankTracker
+from ranking_engine import fold_results, rank_leaderboard, totals_to_frame
+from utils import Config
+
+logger = logging.getLogger(__name__)
+
+# Types of the generated CSV's numeric columns; the rest are strings
+CSV_COLUMN_TYPES: Dict[str, Callable[[str], Any]] = {
+    'Rank': int,
+    'Quizzes_Participated': int,
+    'Avg_Points': float,
+    'Avg_Time': float,
+    'Final_Score': float,
+}
+
+
+def read_leaderboard_csv(path: Path) -> List[Dict[str, Any]]:
+    """Read the generated leaderboard CSV as records with the stdlib csv module.
+
+    Gives the records pd.read_csv(...).to_dict(orient='records') would, except
+    that usernames are always strings, without importing pandas.
+    """
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return []
+        converters = [CSV_COLUMN_TYPES.get(name, str) for name in header]
+        return [{name: convert(value) for name, convert, value in zip(header, converters, row)}
+                for row in reader if row]
+
+
+class LeaderboardRepository:
+    """Interface shared by the storage backends.
+
+    Attributes:
+        history: Per-quiz result store used for time windows
+        stores_results: True if the recorded results are the source of
+            truth for the all-time leaderboard
+    """
+
+    stores_results = False
+
+    def __init__(self, history: Optional[QuizHistory] = None):
+        self.history = history or QuizHistory()
+
+    def source_paths(self) -> List[Path]:
+        """Files whose stat() identifies the current leaderboard version."""
+        raise NotImplementedError
+
+    def load_leaderboard(self) -> List[Dict[str, Any]]:
+        """Return the ranked cumulative leaderboard as records."""
+        raise NotImplementedError
+
+    def user_totals(self) -> Dict[str, List[float]]:
+        """All-time [count, total_score, total_seconds] per user."""
+        raise NotImplementedError
+
+    def record_results(self, source: str, results: Iterable[QuizResult], reset: bool = False,
+                       pending: Iterable[QuizResult] = ()) -> int:
+        """Store newly parsed results of one export in a single transaction."""
+        return self.history.ingest(source, results, reset=reset, pending=pending)
+
+
+class FileRepository(LeaderboardRepository):
+    """The original layout: a raw export plus the generated CSV and snapshot."""
+
+    def __init__(self, data_file: Path = Config.QUIZ_DATA_FILE,
+                 csv_file: Path = Config.LEADERBOARD_CSV,
+                 snapshot_file: Path = Config.LEADERBOARD_SNAPSHOT,
+                 history: Optional[QuizHistory] = None):
+        super().__init__(history)
+        self.data_file = Path(data_file)
+        self.csv_file = Path(csv_file)
+        self.snapshot_file = Path(snapshot_file)
+
+    def source_paths(self) -> List[Path]:
+        return [self.snapshot_file, self.csv_file, self.data_file]
+
+    def snapshot_is_current(self) -> bool:
+        """True if the columnar snapshot exists and is not older than the CSV."""
+        if not self.snapshot_file.exists():
+            return False
+        return (not self.csv_file.exists()
+                or self.snapshot_file.stat().st_mtime_ns >= self.csv_file.stat().st_mtime_ns)
+
+    def load_leaderboard(self) -> List[Dict[str, Any]]:
+        # Memory-map the typed snapshot written alongside the CSV
+        if self.snapshot_is_current():
+            logger.info(f"Loading leaderboard from snapshot: {self.snapshot_file}")
+            with stage('read'):
+                return snapshot_records(load_snapshot(self.snapshot_file))
+
+        # Then try to load from CSV for better performance
+        if self.csv_file.exists():
+            logger.info(f"Loading leaderboard from CSV: {self.csv_file}")
+            with stage('read'):
+                return read_leaderboard_csv(self.csv_file)
+
+        # Fallback to processing raw data
+        if not self.data_file.exists():
+            logger.error(f"Data file not found: {self.data_file}")
+            return []
+
+        logger.info(f"Processing raw data from: {self.data_file}")
+        # Parsing and aggregation are one streaming pass
+        with stage('parse'):
+            users = self.user_totals()
+        if not users:
+            logger.warning("No valid quiz data found")
+            return []
+        with stage('score'):
+            return rank_leaderboard(totals_to_frame(users)).to_dict(orient='records')
+
+    def user_totals(self) -> Dict[str, List[float]]:
+        users: Dict[str, List[float]] = {}
+        if self.data_file.exists():
+            fold_results(iter_unique_results(self.data_file), users)
+        return users
+
+
+class SQLiteRepository(LeaderboardRepository):
+    """Results in the SQLite history store are the source of truth.
+
+    Every ingest updates the materialized user_totals table in the same
+    transaction as the results, so ranking reads one row per participant
+    however many results are stored. Ranks are kept in a RankTracker between
+    loads, so after an ingest only the users whose totals changed are
+    re-ranked.
+    """
+
+    stores_results = True
+
+    def __init__(self, history: Optional[QuizHistory] = None):
+        super().__init__(history)
+        self._tracker: Optional[RankTracker] = None
+        self._lock = threading.Lock()
+
+    def source_paths(self) -> List[Path]:
+        return self.history.source_paths()
+
+    def load_leaderboard(self) -> List[Dict[str, Any]]:
+        with stage('aggregate'):
+            users = self.user_totals()
+        if not users:
+            logger.warning(f"No quiz results stored in {self.history.db_path}")
+            return []
+        with stage('score'), self._lock:
+            if self._tracker is None:
+                logger.info(f"Ranking {len(users)} participants from {self.history.db_path}")
+                self._tracker = RankTracker(users)
+            else:
+                changed = self._tracker.sync(users)
+                logger.info(f"Re-ranked {changed} of {len(users)} participants from {self.history.db_path}")
+            return self._tracker.records()
+
+    def user_totals(self) -> Dict[str, List[float]]:
+        return self.history.user_totals()
+
+
+BACKENDS = {
+    'files': FileRepository,
+    'sqlite': SQLiteRepository,
+}
+
+
+def get_repository(backend: str = Config.STORAGE_BACKEND,
+                   history: Optional[QuizHistory] = None) -> LeaderboardRepository:
+    """Create the configured repository.
+
+    Raises:
+        ValueError: If backend is not one of BACKENDS
+    """
+    try:
+        repository_class = BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown storage backend '{backend}'. Choose from: {', '.join(BACKENDS)}")
+    return repository_class(history=history)
@@ -0,0 +1,84 @@
+"""
+Shared time-string parsing for Telegram quiz results.
+Converts answer times like '45.4 sec' or '1 min 5 sec' to seconds, with a
+memoized scalar path for line-by-line parsing and a vectorized path for
+whole pandas Series.
+"""
+
+import re
+import logging
+from functools import lru_cache
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# One pass over '[X min[utes]] [Y[.Y] sec[onds]]', case-insensitive
+TIME_PATTERN = re.compile(
+    r'^\s*(?:(?P<minutes>\d+)\s*min[a-z]*)?\s*(?:(?P<seconds>\d+(?:\.\d+)?)\s*sec[a-z]*)?\s*$',
+    re.IGNORECASE
+)
+
+# Fallback for strings that only partially follow the expected layout
+_MINUTES_SEARCH = re.compile(r'(\d+)\s*min')
+_SECONDS_SEARCH = re.compile(r'(\d+(?:\.\d+)?)\s*sec')
+
+# Distinct time strings are few (one per tenth of a second), so this bounds
+# memory while keeping hit rates near 100% on real exports
+TIME_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=TIME_CACHE_SIZE)
+def _parse_time(time_str: str) -> float:
+    """Parse a non-empty time string; memoized on the raw string."""
+    match = TIME_PATTERN.match(time_str)
+    if match:
+        minutes, seconds = match.group('minutes', 'seconds')
+        return (int(minutes) * 60 if minutes else 0) + (float(seconds) if seconds else 0.0)
+
+    time_str = time_str.lower()
+    total_seconds = 0.0
+    min_match = _MINUTES_SEARCH.search(time_str)
+    if min_match:
+        total_seconds += int(min_match.group(1)) * 60
+    sec_match = _SECONDS_SEARCH.search(time_str)
+    if sec_match:
+        total_seconds += float(sec_match.group(1))
+    return total_seconds
+
+
+def parse_time_to_seconds(time_str: Any) -> float:
+    """Converts strings like '1 min 35 sec' or '45.6 sec' to float seconds."""
+    if not time_str or not isinstance(time_str, str):
+        return 0.0
+
+    try:
+        return _parse_time(time_str)
+    except ValueError as e:
+        logger.warning(f"Error parsing time string '{time_str}': {e}")
+        return 0.0
+
+
+def is_valid_time(time_str: str) -> bool:
+    """Return True if the string strictly follows the expected time layout."""
+    match = TIME_PATTERN.match(time_str)
+    return bool(match) and any(match.group('minutes', 'seconds'))
+
+
+def parse_time_series(times: "pd.Series", strict: bool = False) -> "pd.Series":
+    """Vectorized parse_time_to_seconds over a Series of time strings.
+
+    Strings matching TIME_PATTERN are converted in a single str.extract pass;
+    the rare irregular ones fall back to the scalar parser, or with strict
+    become NaN, like the strings is_valid_time rejects.
+    """
+    import pandas as pd
+
+    parts = times.astype('string').str.extract(TIME_PATTERN)
+    minutes = pd.to_numeric(parts['minutes'], errors='coerce')
+    seconds = pd.to_numeric(parts['seconds'], errors='coerce')
+    result = minutes.fillna(0).astype('float64') * 60 + seconds.fillna(0).astype('float64')
+
+    irregular = minutes.isna() & seconds.isna() & times.notna()
+    if irregular.any():
+        result[irregular] = float('nan') if strict else times[irregular].map(parse_time_to_seconds)
+    return result.rename(times.name)
@@ -5,9 +5,13 @@ Common helper functions used across multiple modules.
 
 import os
 import json
+import shutil
+import hashlib
 import logging
+import tempfile
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import IO, Dict, Any, Iterator, List, Optional
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -19,9 +23,21 @@ class Config:
     PARTICIPATION_WEIGHT = 50
     ACCURACY_WEIGHT = 25
     SPEED_WEIGHT = 25
+    SPEED_THRESHOLD_SECONDS = 50  # Full speed points at or below this average time
     
-    # File paths
-    DATA_DIR = Path(__file__).parent.parent / "data"
+    # Remark bands (Final_Score) and tie-breaker seed
+    TIE_BREAK_SEED = 42
+    REMARK_HIGH_THRESHOLD = 40
+    REMARK_MID_THRESHOLD = 20
+    # Remarks ordered from the lowest to the highest band
+    REMARKS = (
+        "እናንተማ እያውደለደላችሁ ነው፤ ሥራህን አውቃለሁ፤ በራድ ወይም ትኩስ እንዳልሆንህ፤ በራድ ወይም ትኩስ ብትሆንስ መልካም በሆነ ነበር። እንዲሁ ለዘብተኛ ስለሆንህ በራድም ወይም ትኩስ ስላልሆንህ ከአፌ ልተፋህ ነው። የተባለው ለናንተ ነው የሚመስለው😂",
+        "እንዴ በርቱ እንጂ አሁን F ላይ ናችሁ፤ በቀጣይ NG ነው የሚሆነው🤭",
+        "እግዚአብሔር ያክብራችሁ በርቱ🥰",
+    )
+    
+    # File paths; QUIZ_DATA_DIR points the API and generator at another data set
+    DATA_DIR = Path(os.environ.get("QUIZ_DATA_DIR", Path(__file__).parent.parent / "data"))
     DOCS_DIR = Path(__file__).parent.parent / "docs"
     ASSETS_DIR = Path(__file__).parent.parent / "assets"
     
@@ -29,11 +45,53 @@ class Config:
     QUIZ_DATA_FILE = DATA_DIR / "quizRankData.txt"
     LEADERBOARD_CSV = DATA_DIR / "cumulative_leaderboard.csv"
     LEADERBOARD_MD = DOCS_DIR / "CumulativeLeaderboard.md"
+    LEADERBOARD_SNAPSHOT = DATA_DIR / "cumulative_leaderboard.npy"
+    RANKING_STATE_FILE = DATA_DIR / ".ranking_state.json"
+    DUPLICATE_REPORT = DATA_DIR / "duplicate_blocks.json"
+    VALIDATION_REPORT = DATA_DIR / "validation_report.json"
+    GENERATOR_METRICS_FILE = DATA_DIR / "generate_rankings.prom"
+    PROFILE_DIR = DATA_DIR / "profiles"
+    SHARED_SNAPSHOT_DIR = DATA_DIR / ".shared"
+    HISTORY_DB = DATA_DIR / "quiz_history.db"
+    INBOX_DIR = DATA_DIR / "inbox"  # Watched by scripts/ingest_daemon.py
+    
+    # Storage backend: "files" ranks from the snapshot/CSV/raw export,
+    # "sqlite" from the aggregates kept in HISTORY_DB
+    STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "files")
+    DB_BUSY_TIMEOUT_SECONDS = 30.0
     
     # API settings
-    API_HOST = "0.0.0.0"
-    API_PORT = 8000
+    API_HOST = os.environ.get("API_HOST", "0.0.0.0")
+    API_PORT = int(os.environ.get("API_PORT", "8000"))
     API_RELOAD = True  # Set to False in production
+    # Worker processes; above 1 they serve a shared snapshot published by
+    # the parent process (see scripts/shared_leaderboard.py)
+    API_WORKERS = int(os.environ.get("API_WORKERS", "1"))
+    SHARED_SNAPSHOT_KEEP = 3
+    MAX_PAGE_SIZE = 500
+    MAX_NEIGHBORS = 25
+    WINDOW_CACHE_SIZE = 32  # Ranked time windows kept per process
+    # Keep a profile of requests slower than this many ms; unset disables profiling
+    PROFILE_SLOW_REQUEST_MS = float(os.environ["PROFILE_SLOW_MS"]) if os.environ.get("PROFILE_SLOW_MS") else None
+    
+    # Leaderboard rebuilds run off the event loop; requests wait at most
+    # RANKING_TIMEOUT_SECONDS before the previous version is served
+    RANKING_WORKERS = 1
+    # Processes used to parse several export files in parallel
+    INGEST_WORKERS = os.cpu_count() or 1
+    RANKING_TIMEOUT_SECONDS = 1.0
+    
+    # Live update stream (Server-Sent Events)
+    WATCH_INTERVAL_SECONDS = 1.0
+    SSE_HEARTBEAT_SECONDS = 15.0
+    SSE_QUEUE_SIZE = 16
+    
+    # Ingest daemon: an inbox change is processed once writes pause for
+    # INBOX_DEBOUNCE_SECONDS, and at most INBOX_MAX_DELAY_SECONDS after the
+    # first write; INBOX_POLL_SECONDS applies where inotify is unavailable
+    INBOX_DEBOUNCE_SECONDS = 0.2
+    INBOX_MAX_DELAY_SECONDS = 0.5
+    INBOX_POLL_SECONDS = 0.1
     
     # Validation limits
     MAX_USERNAME_LENGTH = 30
@@ -41,6 +99,12 @@ class Config:
     MAX_SCORE = 100
     MAX_TIME_SECONDS = 300
     MAX_SEARCH_LENGTH = 50
+    # Batch validation: lines per vectorized chunk, rejected line numbers
+    # kept per rule, and the share of invalid result lines that fails the
+    # pre-ingest check of generate_rankings --validate
+    VALIDATION_CHUNK_LINES = 100_000
+    VALIDATION_SAMPLE_LINES = 5
+    VALIDATION_MAX_INVALID_RATE = 0.01
 
 def setup_logging(log_level: str = "INFO", log_file: Optional[Path] = None) -> None:
     """Setup logging configuration."""
@@ -70,19 +134,110 @@ def ensure_directories() -> None:
         directory.mkdir(parents=True, exist_ok=True)
 
 def backup_file(file_path: Path, backup_suffix: str = ".backup") -> bool:
-    """Create a backup of a file."""
+    """Create a backup of a file, leaving the original in place.
+    
+    The backup is a hard link where the filesystem allows it, so no data is
+    copied; the next atomic_write replaces the original's directory entry
+    and leaves the linked inode with the backup.
+    """
     if not file_path.exists():
         return False
     
     try:
         backup_path = file_path.with_suffix(file_path.suffix + backup_suffix)
-        file_path.rename(backup_path)
+        backup_path.unlink(missing_ok=True)
+        try:
+            os.link(file_path, backup_path)
+        except OSError:
+            shutil.copy2(file_path, backup_path)
         logger.info(f"Created backup: {backup_path}")
         return True
     except Exception as e:
         logger.error(f"Failed to create backup of {file_path}: {e}")
         return False
 
+def file_digest(file_path: Path) -> Optional[str]:
+    """SHA-256 of a file's content, or None if it does not exist."""
+    try:
+        with open(file_path, 'rb') as f:
+            return hashlib.file_digest(f, 'sha256').hexdigest()
+    except FileNotFoundError:
+        return None
+
+def same_content(first: Path, second: Path) -> bool:
+    """Compare two files by size first, then by hash."""
+    try:
+        if os.path.getsize(first) != os.path.getsize(second):
+            return False
+    except OSError:
+        return False
+    return file_digest(first) == file_digest(second)
+
+def _fsync_directory(directory: Path) -> None:
+    """Persist a rename on POSIX; a no-op where directories cannot be opened."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+@contextmanager
+def atomic_write(file_path: Path, mode: str = 'w', encoding: Optional[str] = 'utf-8',
+                 backup_suffix: Optional[str] = None) -> Iterator[IO]:
+    """Write a file crash-safely: readers see either the old or the new content.
+    
+    Yields a file object for a temporary file in the same directory. On a
+    clean exit it is fsynced and moved over file_path with os.replace. If
+    the new content is identical to the existing file, the temporary file
+    is dropped instead, so the original keeps its mtime and no backup is
+    made. Otherwise a backup of the previous version is taken first when
+    backup_suffix is given. On error the original is left untouched.
+    """
+    file_path = Path(file_path)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_name = tempfile.mkstemp(dir=file_path.parent, prefix=f".{file_path.name}.", suffix=".tmp")
+    temp_path = Path(temp_name)
+    try:
+        with os.fdopen(fd, mode, encoding=None if 'b' in mode else encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        
+        if same_content(temp_path, file_path):
+            temp_path.unlink()
+            logger.debug(f"{file_path} unchanged, keeping the existing file")
+            return
+        
+        if backup_suffix:
+            backup_file(file_path, backup_suffix)
+        # mkstemp creates 0600 files; keep the original's permissions
+        if file_path.exists():
+            shutil.copymode(file_path, temp_path)
+        else:
+            os.chmod(temp_path, 0o644)
+        os.replace(temp_path, file_path)
+        _fsync_directory(file_path.parent)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+def display_path(path: Any) -> str:
+    """A path as shown in reports: relative to the data directory's parent, or just its name.
+
+    Keeps the absolute paths of the machine that ran a job out of the
+    reports it writes.
+    """
+    path = Path(path)
+    try:
+        return path.resolve().relative_to(Config.DATA_DIR.resolve().parent).as_posix()
+    except ValueError:
+        return path.name
+
 def get_file_info(file_path: Path) -> Dict[str, Any]:
     """Get file information including size, modification time, etc."""
     if not file_path.exists():
@@ -176,7 +331,7 @@ def generate_stats_summary(data: List[Dict[str, Any]]) -> Dict[str, Any]:
 def export_to_json(data: Any, file_path: Path) -> bool:
     """Export data to JSON file."""
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
+        with atomic_write(file_path) as f:
             json.dump(data, f, indent=2, ensure_ascii=False, default=str)
         logger.info(f"Data exported to JSON: {file_path}")
         return True